@@ -0,0 +1,303 @@
+import os, sys, json, math, time, struct, argparse, itertools
+from collections import deque
+import tictactoe_v1 as v1
+import tictactoe_v2 as v2
+from tictactoe_tables import LIST_SYMMETRIES_INV, canonicalizeCells
+
+
+## ###################
+## PROGRAM PARAMETERS
+## ###################
+CHUNK_SIZE  = 256 ## positions sent to a worker at once
+NUM_WORKERS = os.cpu_count() or 1 ## search processes (0: search in this process)
+NUM_CHUNKS_IN_FLIGHT = 2 ## chunks queued per worker (bounds the memory of a run)
+
+
+## ###################
+## POSITIONS
+## ###################
+## a position is a hashable tuple (rules, board, pieces_p1, pieces_p2, player_sgn, depth):
+## the 9 cells of the board as signed piece sizes (player > 0, AI < 0), the pieces
+## each side has left as 5 flags (v2 only), the side to move, and the search depth
+## (v2 only). v1 boards hold -1, 0 or 1.
+def parsePosition(dict_record, rules="v2", depth=v2.MAX_DEPTH):
+  ## position of a JSON record: {"rules", "board", "pieces_p1", "pieces_p2", "player", "depth"}.
+  ## the side to move defaults to the one that follows from the position (the player moves first).
+  rules = dict_record.get("rules", rules)
+  if rules not in ("v1", "v2"):
+    raise ValueError(f"Unknown rules: {rules}")
+  board = tuple(int(cell_value) for row in dict_record["board"] for cell_value in row)
+  if len(board) != 9:
+    raise ValueError("The board must have 3 rows of 3 cells.")
+  if rules == "v1":
+    if any(abs(cell_value) > 1 for cell_value in board):
+      raise ValueError("v1 cells must be -1, 0 or 1.")
+    player_sgn = dict_record.get("player", 1 if (sum(board) == 0) else -1)
+    pieces_p1 = pieces_p2 = depth = None
+  else:
+    pieces_p1 = tuple(int(bool(flag)) for flag in dict_record.get("pieces_p1", [1] * 5))
+    pieces_p2 = tuple(int(bool(flag)) for flag in dict_record.get("pieces_p2", [1] * 5))
+    if (len(pieces_p1) != 5) or (len(pieces_p2) != 5) or any(abs(cell_value) > 5 for cell_value in board):
+      raise ValueError("v2 positions have 5 piece sizes per player.")
+    player_sgn = dict_record.get("player", 1 if (sum(pieces_p1) == sum(pieces_p2)) else -1)
+    depth = int(dict_record.get("depth", depth))
+    if depth < 1:
+      raise ValueError("The search depth must be positive.")
+  if player_sgn not in (1, -1):
+    raise ValueError("The player must be 1 or -1.")
+  return (rules, board, pieces_p1, pieces_p2, player_sgn, depth)
+
+def encodePosition(position):
+  ## JSON record of a position (the inverse of `parsePosition`)
+  rules, board, pieces_p1, pieces_p2, player_sgn, depth = position
+  dict_record = {"rules": rules, "board": [list(board[3*y_index : 3*y_index + 3]) for y_index in range(3)]}
+  if rules == "v2":
+    dict_record["pieces_p1"] = list(pieces_p1)
+    dict_record["pieces_p2"] = list(pieces_p2)
+  dict_record["player"] = player_sgn
+  return dict_record
+
+def decodePacked(packed, rules="v2", depth=v2.MAX_DEPTH):
+  ## position of a binary record: a `tictactoe_v2.GameState` packed int for v2, and
+  ## mask_p1 | (mask_p2 << 9) for v1
+  if rules == "v1":
+    mask_p1, mask_p2 = packed & v1.FULL_MASK, (packed >> 9) & v1.FULL_MASK
+    if (mask_p1 & mask_p2) or (packed >> 18):
+      raise ValueError(f"Invalid v1 record: {packed:#x}")
+    board = tuple(((mask_p1 >> cell_index) & 1) - ((mask_p2 >> cell_index) & 1) for cell_index in range(9))
+    return (rules, board, None, None, 1 if (sum(board) == 0) else -1, None)
+  if packed >> (v2.STATE_PIECES_SHIFT_P2 + 5):
+    raise ValueError(f"Invalid v2 record: {packed:#x}")
+  state = v2.GameState(packed)
+  list_board = []
+  for cell_index in range(9):
+    digit = state.getCellDigit(cell_index)
+    if digit > 10:
+      raise ValueError(f"Invalid v2 record: {packed:#x}")
+    list_board.append(digit if (digit <= 5) else 5 - digit)
+  pieces_p1 = tuple((state.pieces_p1 >> piece_index) & 1 for piece_index in range(5))
+  pieces_p2 = tuple((state.pieces_p2 >> piece_index) & 1 for piece_index in range(5))
+  return (rules, tuple(list_board), pieces_p1, pieces_p2, state.player_sgn, depth)
+
+def canonicalizePosition(position):
+  ## (canonical position, symmetry index): one of the 8 symmetric positions stands for
+  ## all of them, and `restoreResult` maps its result back
+  rules, board, pieces_p1, pieces_p2, player_sgn, depth = position
+  board, sym_index = canonicalizeCells(board)
+  return (rules, board, pieces_p1, pieces_p2, player_sgn, depth), sym_index
+
+def restoreResult(dict_result, sym_index):
+  ## result of the canonical position, for the position it was made from
+  dict_move = dict_result["move"]
+  if (dict_move is None) or (sym_index == 0):
+    return dict_result
+  cell_index = LIST_SYMMETRIES_INV[sym_index][3*dict_move["y"] + dict_move["x"]]
+  return {**dict_result, "move": {**dict_move, "x": cell_index % 3, "y": cell_index // 3}}
+
+def expandGameRecord(dict_game, depth=v2.MAX_DEPTH):
+  ## (ply, position, played move) before each move of a `tictactoe_selfplay` game record
+  rules = dict_game["rules"]
+  list_board = [0] * 9
+  list_pieces = {1: [1] * 5, -1: [1] * 5}
+  list_positions = []
+  for ply_index, dict_move in enumerate(dict_game["moves"]):
+    player_sgn = dict_move["player"]
+    cell_index = dict_move["cell"]
+    if rules == "v1":
+      list_positions.append((ply_index, (rules, tuple(list_board), None, None, player_sgn, None), {"cell": cell_index}))
+      list_board[cell_index] = player_sgn
+      continue
+    position = (rules, tuple(list_board), tuple(list_pieces[1]), tuple(list_pieces[-1]), player_sgn, depth)
+    list_positions.append((ply_index, position, {"cell": cell_index, "size": dict_move["size"]}))
+    list_board[cell_index] = player_sgn * dict_move["size"]
+    list_pieces[player_sgn][dict_move["size"] - 1] = 0
+  return list_positions
+
+
+## ###################
+## INPUT STREAMS
+## ###################
+## generators of (output record, position), where the position is replaced by an error
+## message when an input record cannot be read
+def readJsonRecords(input_file, rules="v2", depth=v2.MAX_DEPTH):
+  ## JSON lines holding positions, or whole game records (with "moves"), which are
+  ## expanded into the position before each move
+  for line_index, line in enumerate(input_file):
+    if not line.strip():
+      continue
+    try:
+      dict_record = json.loads(line)
+      if "moves" not in dict_record:
+        position = parsePosition(dict_record, rules, depth)
+        list_positions = None
+      else: list_positions = expandGameRecord(dict_record, depth)
+    except (ValueError, KeyError, TypeError, IndexError) as error:
+      yield {"line": line_index + 1}, f"{type(error).__name__}: {error}"
+      continue
+    if list_positions is None:
+      yield dict_record, position
+      continue
+    for ply_index, position, dict_played in list_positions:
+      yield {"line": line_index + 1, "ply": ply_index, **encodePosition(position), "played": dict_played}, position
+
+def readBinaryRecords(input_file, rules="v2", depth=v2.MAX_DEPTH, num_records_read=4096):
+  ## little-endian uint64 records (see `decodePacked`)
+  record_index = 0
+  while True:
+    bytes_read = input_file.read(8 * num_records_read)
+    if len(bytes_read) == 0:
+      return
+    if len(bytes_read) % 8 != 0:
+      raise ValueError("The binary input is not a whole number of 8-byte records.")
+    for (packed,) in struct.iter_unpack("<Q", bytes_read):
+      try:
+        position = decodePacked(packed, rules, depth)
+      except ValueError as error:
+        yield {"index": record_index}, f"{type(error).__name__}: {error}"
+      else: yield {"index": record_index, **encodePosition(position)}, position
+      record_index += 1
+
+
+## ###################
+## SEARCH WORKERS
+## ###################
+dict_worker_games = None
+
+def initialiseWorker(bool_tables=True):
+  ## one game per rule set; `bool_tables=False` always searches, instead of using the
+  ## v1 book, the v2 solved table and the search caches where they cover the position
+  global dict_worker_games
+  game_v1 = v1.TicTacToe()
+  game_v2 = v2.TicTacToe()
+  if not bool_tables:
+    game_v1.book = None
+    game_v1.search_cache = None
+    game_v2.solved_table = None
+    game_v2.search_cache = None
+  dict_worker_games = {"v1": game_v1, "v2": game_v2}
+
+def analysePosition(position):
+  ## best move for the side to move, and its score for the AI (`max` for the AI, `min`
+  ## for the player). a finished game has no move, and the score of its outcome.
+  rules, board, pieces_p1, pieces_p2, player_sgn, depth = position
+  game = dict_worker_games[rules]
+  game.board = [list(board[3*y_index : 3*y_index + 3]) for y_index in range(3)]
+  if rules == "v2":
+    game.list_piece_flags_p1 = list(pieces_p1)
+    game.list_piece_flags_p2 = list(pieces_p2)
+  status = game.checkGameOverStatus()
+  if status is not None:
+    return {"score": -status, "move": None}
+  if rules == "v1":
+    ## the book is for the side that follows from the position
+    result = game.lookupBook() if (player_sgn == (1 if (sum(board) == 0) else -1)) else None
+    if result is None:
+      game.resetSearchCounters()
+      if player_sgn > 0:
+        result = game.min(-math.inf, math.inf)
+      else: result = game.max(-math.inf, math.inf)
+    score, (row_index, col_index) = result
+    move = None if (row_index is None) else {"x": col_index, "y": row_index, "size": None}
+    return {"score": score, "move": move}
+  result = game.lookupSolvedTable(player_sgn)
+  if result is None:
+    game.max_depth = depth
+    game.resetSearchCounters()
+    if player_sgn > 0:
+      result = game.min(-math.inf, math.inf, 0)
+    else: result = game.max(-math.inf, math.inf, 0)
+    game.max_depth = v2.MAX_DEPTH
+  score, (x, y), piece_index = result
+  move = None if (x is None) else {"x": x, "y": y, "size": piece_index + 1}
+  return {"score": score, "move": move}
+
+def analysePositions(list_positions):
+  ## one chunk: a single round trip to the worker for many positions
+  return [analysePosition(position) for position in list_positions]
+
+
+## ###################
+## PIPELINE
+## ###################
+def analyseStream(iter_records, chunk_size=CHUNK_SIZE, num_workers=NUM_WORKERS, bool_tables=True):
+  ## generator: the (output record, position) stream annotated with the analysis of each
+  ## position, in input order. at most NUM_CHUNKS_IN_FLIGHT chunks per worker are read
+  ## ahead, so memory stays bounded however long the input is.
+  iter_chunks = iter(lambda: list(itertools.islice(iter_records, chunk_size)), [])
+  def annotateChunk(list_chunk, list_results):
+    iter_results = iter(list_results)
+    for dict_record, position in list_chunk:
+      if isinstance(position, str):
+        yield {**dict_record, "error": position}
+      else: yield {**dict_record, **next(iter_results)}
+  def getPositions(list_chunk):
+    return [position for _, position in list_chunk if not isinstance(position, str)]
+  if num_workers == 0:
+    initialiseWorker(bool_tables)
+    for list_chunk in iter_chunks:
+      yield from annotateChunk(list_chunk, analysePositions(getPositions(list_chunk)))
+    return
+  from concurrent.futures import ProcessPoolExecutor
+  with ProcessPoolExecutor(num_workers, initializer=initialiseWorker, initargs=(bool_tables,)) as executor:
+    queue_chunks = deque()
+    for list_chunk in iter_chunks:
+      queue_chunks.append((list_chunk, executor.submit(analysePositions, getPositions(list_chunk))))
+      if len(queue_chunks) >= NUM_CHUNKS_IN_FLIGHT * num_workers:
+        list_chunk, future = queue_chunks.popleft()
+        yield from annotateChunk(list_chunk, future.result())
+    while len(queue_chunks) > 0:
+      list_chunk, future = queue_chunks.popleft()
+      yield from annotateChunk(list_chunk, future.result())
+
+
+## ###################
+## DEFINE MAIN PROGRAM
+## ###################
+def main():
+  parser = argparse.ArgumentParser(description="Annotate a stream of tic-tac-toe positions with the best move and score.")
+  parser.add_argument("input", help="JSON lines (positions or game records), or binary records with --binary ('-': stdin)")
+  parser.add_argument("--output", default=None, help="write the annotated JSON lines to this file (default: stdout)")
+  parser.add_argument("--binary", action="store_true", help="the input holds 8-byte packed positions")
+  parser.add_argument("--rules", choices=["v1", "v2"], default="v2", help="rules of records that do not name theirs")
+  parser.add_argument("--depth", type=int, default=v2.MAX_DEPTH, help="v2 search depth of records that do not set theirs")
+  parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+  parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="search processes (0: this process)")
+  parser.add_argument("--no-tables", action="store_true", help="always search, even where the v1 book, v2 solved table or a search cache has the answer")
+  args = parser.parse_args()
+  if args.input == "-":
+    input_file = sys.stdin.buffer if args.binary else sys.stdin
+  else: input_file = open(args.input, "rb" if args.binary else "r")
+  output_file = open(args.output, "w") if (args.output is not None) else sys.stdout
+  if args.binary:
+    iter_records = readBinaryRecords(input_file, args.rules, args.depth)
+  else: iter_records = readJsonRecords(input_file, args.rules, args.depth)
+  time_start = time.perf_counter()
+  num_positions = 0
+  num_errors = 0
+  try:
+    for dict_record in analyseStream(iter_records, args.chunk_size, args.workers, not args.no_tables):
+      output_file.write(json.dumps(dict_record) + "\n")
+      num_positions += 1
+      num_errors += "error" in dict_record
+  finally:
+    if input_file not in (sys.stdin, sys.stdin.buffer):
+      input_file.close()
+    if output_file is not sys.stdout:
+      output_file.close()
+  time_elapsed = time.perf_counter() - time_start
+  print(json.dumps({
+    "positions": num_positions,
+    "errors": num_errors,
+    "seconds": time_elapsed,
+    "positions_per_second": num_positions / time_elapsed if (time_elapsed > 0) else 0.0
+  }), file=sys.stderr)
+
+
+## ###################
+## RUN MAIN
+## ###################
+if __name__ == "__main__":
+  main()
+
+
+## END OF PROGRAM
@@ -0,0 +1,213 @@
+import gc, sys, json, time, platform, argparse, tracemalloc
+import numpy as np
+import tictactoe_v1 as v1
+import tictactoe_v2 as v2
+
+
+## ###################
+## PROGRAM PARAMETERS
+## ###################
+NUM_REPEATS      = 3 ## timed runs per position (the fastest one is kept)
+TIME_TOLERANCE   = 0.25 ## allowed slowdown relative to the baseline
+MEMORY_TOLERANCE = 0.25 ## allowed growth of the peak memory relative to the baseline
+NODES_TOLERANCE  = 0.10 ## allowed growth of the searched nodes relative to the baseline
+
+
+## ###################
+## POSITION CORPUS
+## ###################
+## every position is searched with `max`, i.e. with the AI to move. the empty boards
+## (v1_empty, v2_opening) never occur with the AI to move in play, since the player moves
+## first, but are kept as the largest searches of each version. book, solved-table and
+## cache lookups are bypassed, so every position measures `max` itself. v2 positions list
+## the pieces each side has left, and the search depth.
+LIST_POSITIONS = [
+  {
+    "name": "v1_empty", "rules": "v1",
+    "board": [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+  },
+  {
+    "name": "v1_centre", "rules": "v1",
+    "board": [[0, 0, 0], [0, 1, 0], [0, 0, 0]]
+  },
+  {
+    "name": "v1_corner", "rules": "v1",
+    "board": [[1, 0, 0], [0, 0, 0], [0, 0, 0]]
+  },
+  {
+    "name": "v1_midgame", "rules": "v1",
+    "board": [[1, 0, 0], [0, -1, 0], [0, 0, 1]]
+  },
+  {
+    "name": "v2_opening", "rules": "v2", "depth": 4,
+    "board": [[0, 0, 0], [0, 0, 0], [0, 0, 0]],
+    "pieces_p1": [1, 1, 1, 1, 1], "pieces_p2": [1, 1, 1, 1, 1]
+  },
+  {
+    "name": "v2_centre", "rules": "v2", "depth": 5,
+    "board": [[0, 0, 0], [0, 3, 0], [0, 0, 0]],
+    "pieces_p1": [1, 1, 0, 1, 1], "pieces_p2": [1, 1, 1, 1, 1]
+  },
+  {
+    "name": "v2_centre_full", "rules": "v2", "depth": 9,
+    "board": [[0, 0, 0], [0, 5, 0], [0, 0, 0]],
+    "pieces_p1": [1, 1, 1, 1, 0], "pieces_p2": [1, 1, 1, 1, 1]
+  },
+  {
+    "name": "v2_midgame", "rules": "v2", "depth": 5,
+    "board": [[2, 0, 0], [0, -4, 0], [0, 0, 5]],
+    "pieces_p1": [1, 0, 1, 1, 0], "pieces_p2": [1, 1, 1, 0, 1]
+  },
+  {
+    ## the "make best move" position of `TicTacToe.tests`
+    "name": "v2_tactical", "rules": "v2", "depth": v2.MAX_DEPTH,
+    "board": [[-1, 1, 0], [0, 2, 0], [0, 0, 0]],
+    "pieces_p1": [0, 0, 1, 1, 1], "pieces_p2": [0, 1, 1, 1, 1]
+  }
+]
+
+
+## ###################
+## MEASUREMENTS
+## ###################
+def createGames():
+  game_v1 = v1.TicTacToe()
+  game_v1.book = None
+  game_v1.search_cache = None
+  game_v2 = v2.TicTacToe()
+  game_v2.solved_table = None
+  game_v2.search_cache = None
+  return {"v1": game_v1, "v2": game_v2}
+
+def setupPosition(game, dict_position):
+  ## set the position up from scratch: empty transposition table and move ordering heuristics
+  if dict_position["rules"] == "v1":
+    game.board = np.array(dict_position["board"])
+    game.resetSearchCounters()
+    return
+  game.initialise()
+  game.board = np.array(dict_position["board"])
+  game.list_piece_flags_p1 = dict_position["pieces_p1"]
+  game.list_piece_flags_p2 = dict_position["pieces_p2"]
+  game.transposition_table.clear()
+  game.max_depth = dict_position["depth"]
+
+def searchPosition(game, dict_position):
+  if dict_position["rules"] == "v1":
+    score, move = game.max(-np.inf, np.inf)
+    return [float(score), list(move)]
+  score, (x, y), piece_index = game.max(-np.inf, np.inf, 0)
+  return [float(score), [x, y, piece_index]]
+
+def benchmarkPosition(game, dict_position, num_repeats=NUM_REPEATS):
+  ## fastest of `num_repeats` timed searches, then one search under tracemalloc for the peak memory
+  list_seconds = []
+  for _ in range(num_repeats):
+    setupPosition(game, dict_position)
+    gc.collect()
+    time_start = time.perf_counter()
+    result = searchPosition(game, dict_position)
+    list_seconds.append(time.perf_counter() - time_start)
+  num_nodes = game.num_nodes
+  setupPosition(game, dict_position)
+  gc.collect()
+  tracemalloc.start()
+  searchPosition(game, dict_position)
+  _, peak_memory = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  if dict_position["rules"] == "v2":
+    game.max_depth = v2.MAX_DEPTH
+  seconds = min(list_seconds)
+  return {
+    "result": result,
+    "nodes": num_nodes,
+    "seconds": seconds,
+    "nodes_per_second": num_nodes / seconds if (seconds > 0) else 0.0,
+    "peak_memory": peak_memory
+  }
+
+def runBenchmarks(list_names=None, num_repeats=NUM_REPEATS):
+  dict_games = createGames()
+  dict_results = {}
+  for dict_position in LIST_POSITIONS:
+    if (list_names is not None) and (dict_position["name"] not in list_names):
+      continue
+    dict_results[dict_position["name"]] = benchmarkPosition(dict_games[dict_position["rules"]], dict_position, num_repeats)
+  return {
+    "environment": {
+      "python": platform.python_version(),
+      "numpy": np.__version__,
+      "machine": platform.machine(),
+      "platform": platform.platform()
+    },
+    "positions": dict_results
+  }
+
+
+## ###################
+## BASELINES
+## ###################
+def compareResults(
+    dict_baseline, dict_results,
+    time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE, nodes_tolerance=NODES_TOLERANCE
+  ):
+  ## regressions of `dict_results` against a baseline: slower searches, more memory or
+  ## more nodes than the tolerances allow, and changed search results
+  list_regressions = []
+  for name, dict_result in dict_results["positions"].items():
+    dict_base = dict_baseline["positions"].get(name)
+    if dict_base is None:
+      continue
+    if dict_result["result"] != dict_base["result"]:
+      list_regressions.append(f"{name}: result {dict_result['result']} != baseline {dict_base['result']}")
+    for key, tolerance in [("seconds", time_tolerance), ("peak_memory", memory_tolerance), ("nodes", nodes_tolerance)]:
+      if dict_result[key] > dict_base[key] * (1 + tolerance):
+        list_regressions.append(
+          f"{name}: {key} {dict_result[key]:.6g} > baseline {dict_base[key]:.6g} (+{100*tolerance:.0f}% allowed)"
+        )
+  return list_regressions
+
+
+## ###################
+## DEFINE MAIN PROGRAM
+## ###################
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark the v1 and v2 searches on a fixed corpus of positions.")
+  parser.add_argument("--positions", nargs="*", default=None, help="names of the positions to run (default: all)")
+  parser.add_argument("--repeats", type=int, default=NUM_REPEATS)
+  parser.add_argument("--save", default=None, help="write the results to this JSON baseline")
+  parser.add_argument("--baseline", default=None, help="compare the results with this JSON baseline")
+  parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+  parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+  parser.add_argument("--nodes-tolerance", type=float, default=NODES_TOLERANCE)
+  args = parser.parse_args()
+  dict_results = runBenchmarks(args.positions, args.repeats)
+  for name, dict_result in dict_results["positions"].items():
+    print(
+      f"{name:16} {dict_result['nodes']:9d} nodes  {dict_result['seconds']:9.4f} s  "
+      f"{dict_result['nodes_per_second']:10.0f} nodes/s  {dict_result['peak_memory'] / 1024:9.1f} KiB"
+    )
+  if args.save is not None:
+    with open(args.save, "w") as json_file:
+      json.dump(dict_results, json_file, indent=2)
+  if args.baseline is not None:
+    with open(args.baseline) as json_file:
+      dict_baseline = json.load(json_file)
+    list_regressions = compareResults(
+      dict_baseline, dict_results, args.time_tolerance, args.memory_tolerance, args.nodes_tolerance
+    )
+    for regression in list_regressions:
+      print(f"Regression: {regression}")
+    if len(list_regressions) > 0:
+      sys.exit(1)
+    print("No regressions against the baseline.")
+
+
+## ###################
+## RUN MAIN
+## ###################
+if __name__ == "__main__":
+  main()
+
+
+## END OF PROGRAM
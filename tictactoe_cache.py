@@ -0,0 +1,109 @@
+import os, sys
+from collections import OrderedDict
+
+
+## ###################
+## PERSISTENT SEARCH CACHE
+## ###################
+class SearchCache():
+  ## root search results kept between sessions in a SQLite file: key -> (score, bound,
+  ## draft, move), all ints except the score. the file is opened in WAL mode, so any
+  ## number of processes can read it while one of them writes, and each process keeps
+  ## its hot entries in an in-memory LRU. results of an engine `version` other than the
+  ## file's are dropped when it is opened. the cache is only an optimisation: after a
+  ## database error it reports once and turns itself off.
+  def __init__(self, file_path, version=0, lru_size=1 << 12, timeout=5.0):
+    self.file_path = file_path
+    self.version   = str(version)
+    self.lru_size  = lru_size
+    self.timeout   = timeout
+    self.dict_lru  = OrderedDict()
+    self.connection = None
+    self.pid = None
+    self.bool_failed = False
+
+  def connect(self):
+    ## one connection per process: connections must not be shared across a fork
+    if self.pid == os.getpid():
+      return self.connection
+    import sqlite3
+    connection = sqlite3.connect(self.file_path, timeout=self.timeout, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+    connection.execute(
+      "CREATE TABLE IF NOT EXISTS entries "
+      "(key INTEGER PRIMARY KEY, score REAL, bound INTEGER, draft INTEGER, move INTEGER)"
+    )
+    row = connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+    if (row is None) or (row[0] != self.version):
+      connection.execute("BEGIN IMMEDIATE")
+      connection.execute("DELETE FROM entries")
+      connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+      connection.execute("COMMIT")
+    self.connection = connection
+    self.pid = os.getpid()
+    return connection
+
+  def disable(self, error):
+    print(f"Search cache disabled ({self.file_path}): {error}", file=sys.stderr)
+    self.bool_failed = True
+
+  def get(self, key):
+    ## (score, bound, draft, move) stored for a key, or None
+    entry = self.dict_lru.get(key)
+    if entry is not None:
+      self.dict_lru.move_to_end(key)
+      return entry
+    if self.bool_failed:
+      return None
+    import sqlite3
+    try:
+      row = self.connect().execute(
+        "SELECT score, bound, draft, move FROM entries WHERE key = ?", (toSigned64(key),)
+      ).fetchone()
+    except sqlite3.Error as error:
+      self.disable(error)
+      return None
+    if row is None:
+      return None
+    self.storeLRU(key, row)
+    return row
+
+  def put(self, key, score, bound, draft, move):
+    ## keep the result of the deeper search (the newer one at equal depth)
+    entry = self.dict_lru.get(key)
+    if (entry is not None) and (entry[2] > draft):
+      return
+    self.storeLRU(key, (score, bound, draft, move))
+    if self.bool_failed:
+      return
+    import sqlite3
+    try:
+      self.connect().execute(
+        "INSERT INTO entries VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+        "score = excluded.score, bound = excluded.bound, draft = excluded.draft, move = excluded.move "
+        "WHERE excluded.draft >= entries.draft",
+        (toSigned64(key), score, bound, draft, move)
+      )
+    except sqlite3.Error as error:
+      self.disable(error)
+
+  def storeLRU(self, key, entry):
+    self.dict_lru[key] = entry
+    self.dict_lru.move_to_end(key)
+    while len(self.dict_lru) > self.lru_size:
+      self.dict_lru.popitem(last=False)
+
+  def close(self):
+    if (self.connection is not None) and (self.pid == os.getpid()):
+      self.connection.close()
+    self.connection = None
+    self.pid = None
+
+def toSigned64(key):
+  ## SQLite integers are signed 64-bit
+  return key - (1 << 64) if (key >= (1 << 63)) else key
+
+
+## END OF PROGRAM
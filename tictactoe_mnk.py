@@ -0,0 +1,306 @@
+import math, time, random, argparse
+from tictactoe_negamax import negamax
+
+
+## ###########################
+## PROGRAM PARAMETERS
+## ###########################
+NUM_COLS   = 3 ## m
+NUM_ROWS   = 3 ## n
+WIN_LENGTH = 3 ## k: pieces in a row needed to win
+MAX_DEPTH  = None ## search depth limit (None: search to the end of the game)
+
+
+## ###########################
+## LINE TABLES
+## ###########################
+## cell (x, y) is stored in bit (num_cols*y + x) of a mask. lines run along rows,
+## columns, diagonals and anti-diagonals.
+LIST_DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1)]
+
+def createLineTables(num_cols, num_rows, win_length):
+  ## masks of every winning line (`win_length` cells in a row), and the masks of the
+  ## lines through each cell: a move can only complete one of those
+  list_win_masks = []
+  for y_index in range(num_rows):
+    for x_index in range(num_cols):
+      for dx, dy in LIST_DIRECTIONS:
+        x_end = x_index + dx*(win_length - 1)
+        y_end = y_index + dy*(win_length - 1)
+        if (0 <= x_end < num_cols) and (0 <= y_end < num_rows):
+          list_win_masks.append(sum(
+            1 << (num_cols*(y_index + dy*step) + x_index + dx*step)
+            for step in range(win_length)
+          ))
+  list_cell_win_masks = [
+    [win_mask for win_mask in list_win_masks if (win_mask >> cell_index) & 1]
+    for cell_index in range(num_cols * num_rows)
+  ]
+  return list_win_masks, list_cell_win_masks
+
+def createCellOrder(num_cols, num_rows):
+  ## cells sorted by distance to the centre of the board: central cells lie on more lines
+  return sorted(
+    range(num_cols * num_rows),
+    key=lambda cell_index: abs(2*(cell_index % num_cols) - (num_cols - 1)) + abs(2*(cell_index // num_cols) - (num_rows - 1))
+  )
+
+
+## ###########################
+## GAME CLASS
+## ###########################
+class TicTacToe():
+  ## m,n,k game: two players take turns to place a piece on a free cell of an m-by-n
+  ## board, and the first to get k in a row wins. the game-over status is kept up to
+  ## date by `makeMove`/`unmakeMove`, which only look at the lines through the move.
+  ## `tictactoe_negamax` searches it, central cells first.
+  bool_alpha_beta = True
+  bool_pvs        = False
+
+  def __init__(self, num_cols=NUM_COLS, num_rows=NUM_ROWS, win_length=WIN_LENGTH, max_depth=MAX_DEPTH):
+    if win_length > max(num_cols, num_rows):
+      raise Exception(f"No player can get {win_length} in a row on a {num_cols}x{num_rows} board.")
+    self.num_cols   = num_cols
+    self.num_rows   = num_rows
+    self.win_length = win_length
+    self.num_cells  = num_cols * num_rows
+    self.full_mask  = (1 << self.num_cells) - 1
+    self.list_win_masks, self.list_cell_win_masks = createLineTables(num_cols, num_rows, win_length)
+    self.list_cell_order = createCellOrder(num_cols, num_rows)
+    self.max_depth = max_depth
+    self.stats = None
+    self.initialise()
+
+  def initialise(self):
+    self.depth = 0
+    self.mask_p1 = 0 ## player's ('x') pieces
+    self.mask_p2 = 0 ## AI's ('o') pieces
+    self.num_moves = 0
+    ## set by the move that completes a line
+    self.winner = None
+    ## number of lines each player can still complete (no opponent piece in them)
+    self.num_open_p1 = len(self.list_win_masks)
+    self.num_open_p2 = len(self.list_win_masks)
+    self.resetSearchCounters()
+
+  def resetSearchCounters(self):
+    self.num_nodes = 0
+    self.num_cutoffs = 0
+
+  def makeMove(self, cell_index, player_sgn):
+    ## place a piece, and update the status from the lines through it
+    if player_sgn > 0:
+      for win_mask in self.list_cell_win_masks[cell_index]:
+        if not (self.mask_p1 & win_mask):
+          self.num_open_p2 -= 1
+      self.mask_p1 |= 1 << cell_index
+      mask = self.mask_p1
+    else:
+      for win_mask in self.list_cell_win_masks[cell_index]:
+        if not (self.mask_p2 & win_mask):
+          self.num_open_p1 -= 1
+      self.mask_p2 |= 1 << cell_index
+      mask = self.mask_p2
+    self.num_moves += 1
+    for win_mask in self.list_cell_win_masks[cell_index]:
+      if (mask & win_mask) == win_mask:
+        self.winner = player_sgn
+        break
+
+  def unmakeMove(self, cell_index, player_sgn):
+    ## undo `makeMove`: no move is made once a line is complete, so the game was not won before it
+    if player_sgn > 0:
+      self.mask_p1 &= ~(1 << cell_index)
+      for win_mask in self.list_cell_win_masks[cell_index]:
+        if not (self.mask_p1 & win_mask):
+          self.num_open_p2 += 1
+    else:
+      self.mask_p2 &= ~(1 << cell_index)
+      for win_mask in self.list_cell_win_masks[cell_index]:
+        if not (self.mask_p2 & win_mask):
+          self.num_open_p1 += 1
+    self.num_moves -= 1
+    self.winner = None
+
+  def play(self):
+    print("You are 'x', and your oponent (an AI) is 'o'.")
+    print(" ")
+    while True:
+      self.printBoard()
+      status = self.checkGameOverStatus()
+      ## check if the game has concluded
+      if status is not None:
+        print("The game has concluded.")
+        if status > 0:
+          print("You are the winner!")
+        elif status < 0:
+          print("The AI is the winner!")
+        else: print("It is a tie!")
+        return
+      ## player's turn
+      if self.depth % 2 == 0:
+        ## get the player's move
+        while True:
+          print("Choose your move.")
+          x = int(input("Column (x): "))
+          y = int(input("   Row (y): "))
+          if self.isValidMove((x, y)):
+            self.makeMove(self.num_cols*y + x, 1)
+            print(" ")
+            break
+          else:
+            print("Your move was invalid.")
+            print(" ")
+      ## AI's turn
+      else:
+        t_start = time.time()
+        _, cell_index = self.max(-math.inf, math.inf)
+        t_end = time.time()
+        t_elapse = round(t_end - t_start, 7)
+        self.makeMove(cell_index, -1)
+        print(f"Evaluation time: {t_elapse} seconds ({self.num_nodes} nodes).")
+        print(f"The AI's move is: ({cell_index % self.num_cols}, {cell_index // self.num_cols})")
+        print(" ")
+        self.resetSearchCounters()
+      ## increment depth
+      self.depth += 1
+
+  def evaluate(self):
+    ## score (for the AI) of a position where the search stops early: the balance of
+    ## lines each player can still complete, strictly between a loss (-1) and a win (1)
+    return (self.num_open_p2 - self.num_open_p1) / (len(self.list_win_masks) + 1)
+
+  def max(self, alpha, beta, depth=0):
+    ## the AI's best score and move (cell index), searched by `negamax`
+    return negamax(self, -1, alpha, beta, depth)
+
+  def min(self, alpha, beta, depth=0):
+    ## the player's best move (cell index), and its score for the AI
+    value, cell_index = negamax(self, 1, -beta, -alpha, depth)
+    return -value, cell_index
+
+  ## rules interface of `tictactoe_negamax`: moves are cell indices
+  def checkSearchLimits(self, depth):
+    ## depth limit: score the position statically
+    if (self.max_depth is not None) and (depth >= self.max_depth):
+      return self.evaluate()
+    return None
+
+  def getSearchMoves(self, player_sgn, depth, first_move):
+    mask_free = self.full_mask & ~(self.mask_p1 | self.mask_p2)
+    return [cell_index for cell_index in self.list_cell_order if (mask_free >> cell_index) & 1]
+
+  def makeSearchMove(self, cell_index, player_sgn):
+    self.makeMove(cell_index, player_sgn)
+
+  def unmakeSearchMove(self, cell_index, player_sgn, undo):
+    self.unmakeMove(cell_index, player_sgn)
+
+  def probeSearchTable(self, player_sgn, depth, alpha, beta):
+    return None, None, None
+
+  def storeSearchTable(self, entry, player_sgn, depth, value, alpha, beta, cell_index):
+    pass
+
+  def recordCutoff(self, cell_index, player_sgn, depth):
+    pass
+
+  def isValidMove(self, to_coord):
+    x, y = to_coord
+    ## check the coordinates lie within board bounds
+    if not ((0 <= x < self.num_cols) and (0 <= y < self.num_rows)):
+      return False
+    ## check that the target cell is empty
+    return not ((self.mask_p1 | self.mask_p2) >> (self.num_cols*y + x)) & 1
+
+  def checkGameOverStatus(self):
+    if self.winner is not None:
+      return self.winner
+    ## check if there are any free spots available on the board
+    if self.num_moves < self.num_cells:
+      return None
+    ## it is a tie
+    return 0
+
+  def scanGameOverStatus(self):
+    ## `checkGameOverStatus` by checking every line of the board (used by the tests)
+    for win_mask in self.list_win_masks:
+      if (self.mask_p1 & win_mask) == win_mask:
+        return 1
+      if (self.mask_p2 & win_mask) == win_mask:
+        return -1
+    if (self.mask_p1 | self.mask_p2) != self.full_mask:
+      return None
+    return 0
+
+  def printBoard(self):
+    print(" ", "   ".join([str(x_index % 10) for x_index in range(self.num_cols)]))
+    for y_index in range(self.num_rows):
+      for x_index in range(self.num_cols):
+        bit = 1 << (self.num_cols*y_index + x_index)
+        if   self.mask_p1 & bit: piece = "x"
+        elif self.mask_p2 & bit: piece = "o"
+        else: piece = "-"
+        print(f"| {piece}", end=" ")
+      print(f"| {y_index}")
+    print(" ")
+
+  def tests(self):
+    ## check tests work for both players
+    for val in [1, -1]:
+      ## test 1: a diagonal of `win_length` pieces wins
+      self.initialise()
+      for step in range(min(self.win_length, self.num_cols, self.num_rows)):
+        if self.checkGameOverStatus() is not None:
+          raise Exception(f"Failed test 1: premature status {self.checkGameOverStatus()} ({val})")
+        self.makeMove(self.num_cols*step + step, val)
+      if (self.win_length <= min(self.num_cols, self.num_rows)) and not (self.checkGameOverStatus() == val):
+        raise Exception(f"Failed test 1: {val}")
+    ## test 2: the incremental status matches a scan of the whole board in random games,
+    ## and unmaking every move restores the initial counters
+    rng = random.Random(0)
+    for _ in range(20):
+      self.initialise()
+      list_moves = []
+      player_sgn = 1
+      while self.checkGameOverStatus() is None:
+        mask_free = self.full_mask & ~(self.mask_p1 | self.mask_p2)
+        cell_index = rng.choice([cell_index for cell_index in range(self.num_cells) if (mask_free >> cell_index) & 1])
+        self.makeMove(cell_index, player_sgn)
+        list_moves.append((cell_index, player_sgn))
+        if self.checkGameOverStatus() != self.scanGameOverStatus():
+          raise Exception(f"Failed test 2: status {self.checkGameOverStatus()} != {self.scanGameOverStatus()}")
+        player_sgn = -player_sgn
+      for cell_index, player_sgn in reversed(list_moves):
+        self.unmakeMove(cell_index, player_sgn)
+      if (self.mask_p1 | self.mask_p2 | self.num_moves) or (self.num_open_p1 != len(self.list_win_masks)) or (self.num_open_p2 != len(self.list_win_masks)):
+        raise Exception("Failed test 2: unmaking the moves did not restore the board.")
+    ## success
+    self.initialise()
+    print("Passed all tests.")
+    print(" ")
+
+
+## ###################
+## DEFINE MAIN PROGRAM
+## ###################
+def main():
+  parser = argparse.ArgumentParser(description="Play an m,n,k game (k in a row on an m-by-n board) against the AI.")
+  parser.add_argument("--cols", type=int, default=NUM_COLS, help="board width (m)")
+  parser.add_argument("--rows", type=int, default=NUM_ROWS, help="board height (n)")
+  parser.add_argument("--k", type=int, default=WIN_LENGTH, help="pieces in a row needed to win")
+  parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="AI search depth (default: to the end of the game; set it on large boards)")
+  args = parser.parse_args()
+  game = TicTacToe(args.cols, args.rows, args.k, args.depth)
+  game.tests()
+  game.play()
+
+
+## ###################
+## RUN MAIN
+## ###################
+if __name__ == "__main__":
+  main()
+
+
+## END OF PROGRAM
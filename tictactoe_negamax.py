@@ -0,0 +1,341 @@
+import os, sys, math
+
+
+## ###################
+## PROGRAM PARAMETERS
+## ###################
+SCORE_WIN  = 1 ## score of a won game (for the winner); every score lies in [-SCORE_WIN, SCORE_WIN]
+MEMORY_INTERVAL = 1024 ## nodes between two reads of the process memory by `SearchBudget`
+
+
+## ###################
+## RULES INTERFACE
+## ###################
+## the search works on any game object that provides:
+##   num_nodes, num_cutoffs, stats      counters, and `SearchStats` (or None)
+##   bool_alpha_beta                    prune (otherwise a plain minimax search)
+##   bool_pvs                           principal variation search: moves after the first
+##                                      are searched with a null window first
+##   checkGameOverStatus()              1 / -1 if the player / AI won, 0 for a tie, None otherwise
+##   checkSearchLimits(depth)           the AI's static score if the search stops here, else None
+##   getSearchMoves(player_sgn, depth, first_move)
+##                                      legal moves, in the order to search them
+##   makeSearchMove(move, player_sgn)   play a move, and return what undoing it needs
+##   unmakeSearchMove(move, player_sgn, undo)
+##   probeSearchTable(player_sgn, depth, alpha, beta)
+##                                      (value or None, move to search first, entry for storing)
+##   storeSearchTable(entry, player_sgn, depth, value, alpha, beta, move)
+##   recordCutoff(move, player_sgn, depth)
+##   executor                           process pool kept by `searchRootSplit` (or None)
+## the search is a negamax: values are for the side to move (`player_sgn`), so the AI's
+## score of a position is `-player_sgn * value`. a side with no legal move loses.
+
+
+## ###################
+## SEARCH
+## ###################
+def negamax(game, player_sgn, alpha, beta, depth=0):
+  ## fail-soft alpha-beta search: (value for the side to move, best move). the first of
+  ## equally good moves is kept, and the value is exact when it lies strictly inside
+  ## (alpha, beta): otherwise it is an upper (<= alpha) or lower (>= beta) bound.
+  game.num_nodes += 1
+  stats = game.stats
+  if stats is not None:
+    stats.countNode(depth)
+  ## check if the game has concluded
+  status = game.checkGameOverStatus()
+  if status is not None:
+    if stats is not None:
+      stats.countTerminal(depth)
+    return player_sgn * status, None
+  ## depth limit (or time limit) of the rules
+  leaf_score = game.checkSearchLimits(depth)
+  if leaf_score is not None:
+    return -player_sgn * leaf_score, None
+  ## look up previous searches of this position. at the root only a stored move is
+  ## an answer, since the caller wants one.
+  tt_value, tt_move, tt_entry = game.probeSearchTable(player_sgn, depth, alpha, beta)
+  if (tt_value is not None) and ((tt_move is not None) or (depth > 0)):
+    if stats is not None:
+      stats.countTableHit(depth)
+    return tt_value, tt_move
+  bool_alpha_beta = game.bool_alpha_beta
+  bool_pvs = game.bool_pvs
+  alpha_init = alpha
+  best_value = -math.inf
+  best_move = None
+  list_moves = game.getSearchMoves(player_sgn, depth, tt_move)
+  for move_index, move in enumerate(list_moves):
+    undo = game.makeSearchMove(move, player_sgn)
+    if not bool_alpha_beta:
+      value = -negamax(game, -player_sgn, -math.inf, math.inf, depth+1)[0]
+    elif (move_index == 0) or not bool_pvs:
+      value = -negamax(game, -player_sgn, -beta, -alpha, depth+1)[0]
+    else:
+      ## null window: only prove that the move is no better than the best one so far,
+      ## and search it again with the full window if it is
+      value = -negamax(game, -player_sgn, -math.nextafter(alpha, math.inf), -alpha, depth+1)[0]
+      if alpha < value < beta:
+        value = -negamax(game, -player_sgn, -beta, -alpha, depth+1)[0]
+    game.unmakeSearchMove(move, player_sgn, undo)
+    if value > best_value:
+      best_value = value
+      best_move = move
+    if bool_alpha_beta:
+      ## cutoff: the opponent will avoid this position
+      if best_value >= beta:
+        game.num_cutoffs += 1
+        if stats is not None:
+          stats.countCutoff(depth)
+        game.recordCutoff(move, player_sgn, depth)
+        break
+      if best_value > alpha:
+        alpha = best_value
+  if len(list_moves) == 0:
+    best_value = -SCORE_WIN
+  game.storeSearchTable(tt_entry, player_sgn, depth, best_value, alpha_init, beta, best_move)
+  return best_value, best_move
+
+def negamaxStack(game, player_sgn, alpha, beta, depth=0, budget=None):
+  ## `negamax` with an explicit stack instead of recursion: the same nodes are searched
+  ## in the same order, with the same results and table updates. with a `SearchBudget`,
+  ## the search stops (and undoes its moves) once the budget runs out. returns (value,
+  ## best move, complete): a search cut short returns the best root move whose search
+  ## completed so far, or (-inf, None) if there is none yet.
+  stats = game.stats
+  bool_alpha_beta = game.bool_alpha_beta
+  bool_pvs = game.bool_pvs
+  checkGameOverStatus = game.checkGameOverStatus
+  checkSearchLimits = game.checkSearchLimits
+  probeSearchTable = game.probeSearchTable
+  getSearchMoves = game.getSearchMoves
+  makeSearchMove = game.makeSearchMove
+  unmakeSearchMove = game.unmakeSearchMove
+  ## frame of a node being searched: [player_sgn, depth, alpha, beta, alpha_init,
+  ## best_value, best_move, list_moves, next_index, tt_entry, undo, null_window]
+  list_stack = []
+  bool_open = True ## whether the node (player_sgn, alpha, beta, depth) is to be opened next
+  value = None ## value of the last resolved node, for its side to move
+  while True:
+    if bool_open:
+      bool_open = False
+      if (budget is not None) and budget.spendNode():
+        return unwindStack(game, list_stack)
+      game.num_nodes += 1
+      if stats is not None:
+        stats.countNode(depth)
+      tt_move = None
+      status = checkGameOverStatus()
+      if status is not None:
+        if stats is not None:
+          stats.countTerminal(depth)
+        value = player_sgn * status
+      else:
+        leaf_score = checkSearchLimits(depth)
+        if leaf_score is not None:
+          value = -player_sgn * leaf_score
+        else:
+          tt_value, tt_move, tt_entry = probeSearchTable(player_sgn, depth, alpha, beta)
+          if (tt_value is not None) and ((tt_move is not None) or (depth > 0)):
+            if stats is not None:
+              stats.countTableHit(depth)
+            value = tt_value
+          else:
+            list_moves = getSearchMoves(player_sgn, depth, tt_move)
+            list_stack.append([player_sgn, depth, alpha, beta, alpha, -math.inf, None, list_moves, 0, tt_entry, None, False])
+      if (value is not None) and (len(list_stack) == 0):
+        return value, tt_move, True
+    frame = list_stack[-1]
+    player_sgn = frame[0]
+    depth = frame[1]
+    list_moves = frame[7]
+    if value is not None:
+      ## a child of this frame was resolved
+      value = -value
+      move = list_moves[frame[8] - 1]
+      if frame[11]:
+        ## null window: search again with the full window if the move may be better
+        frame[11] = False
+        if frame[2] < value < frame[3]:
+          player_sgn, alpha, beta, depth = -player_sgn, -frame[3], -frame[2], depth + 1
+          bool_open = True
+          value = None
+          continue
+      unmakeSearchMove(move, player_sgn, frame[10])
+      if value > frame[5]:
+        frame[5] = value
+        frame[6] = move
+      value = None
+      if bool_alpha_beta:
+        ## cutoff: the opponent will avoid this position
+        if frame[5] >= frame[3]:
+          game.num_cutoffs += 1
+          if stats is not None:
+            stats.countCutoff(depth)
+          game.recordCutoff(move, player_sgn, depth)
+          frame[8] = len(list_moves)
+        elif frame[5] > frame[2]:
+          frame[2] = frame[5]
+    move_index = frame[8]
+    if move_index < len(list_moves):
+      ## search the next move
+      move = list_moves[move_index]
+      frame[8] = move_index + 1
+      frame[10] = makeSearchMove(move, player_sgn)
+      if not bool_alpha_beta:
+        alpha, beta = -math.inf, math.inf
+      elif (move_index == 0) or not bool_pvs:
+        alpha, beta = -frame[3], -frame[2]
+      else:
+        frame[11] = True
+        alpha, beta = -math.nextafter(frame[2], math.inf), -frame[2]
+      player_sgn = -player_sgn
+      depth += 1
+      bool_open = True
+      continue
+    ## every move was searched (or cut off)
+    list_stack.pop()
+    value = frame[5] if (len(list_moves) > 0) else -SCORE_WIN
+    game.storeSearchTable(frame[9], player_sgn, depth, value, frame[4], frame[3], frame[6])
+    if len(list_stack) == 0:
+      return value, frame[6], True
+
+def unwindStack(game, list_stack):
+  ## undo the moves of an interrupted `negamaxStack`, and return its result so far
+  if len(list_stack) == 0:
+    return -math.inf, None, False
+  for frame in reversed(list_stack):
+    game.unmakeSearchMove(frame[7][frame[8] - 1], frame[0], frame[10])
+  return list_stack[0][5], list_stack[0][6], False
+
+def searchAspiration(game, player_sgn, guess, window):
+  ## root search in the window (guess - window, guess + window): when the value falls
+  ## outside, the window is widened on that side (doubling it) and the search repeated.
+  ## a good guess (the previous iteration's value) makes most searches much smaller.
+  alpha = guess - window
+  beta = guess + window
+  while True:
+    if alpha < -SCORE_WIN:
+      alpha = -math.inf
+    if beta > SCORE_WIN:
+      beta = math.inf
+    value, move = negamax(game, player_sgn, alpha, beta, 0)
+    if value <= alpha:
+      window *= 2
+      alpha = value - window
+    elif value >= beta:
+      window *= 2
+      beta = value + window
+    else: return value, move
+
+
+## ###################
+## PARALLEL ROOT SPLIT
+## ###################
+## an engine supplies a picklable worker entry point `worker_function(*worker_args,
+## player_sgn, move, alpha)`, which searches one root move in a worker process (usually
+## with `searchRootMove`) and returns (value, nodes searched)
+def getExecutor(game, num_workers, initializer):
+  ## the worker processes are kept alive between moves, in `game.executor`
+  if (game.executor is None) or (game.executor._max_workers != num_workers):
+    if game.executor is not None:
+      game.executor.shutdown()
+    from concurrent.futures import ProcessPoolExecutor
+    game.executor = ProcessPoolExecutor(num_workers, initializer=initializer)
+  return game.executor
+
+def searchRootMove(game, player_sgn, move, alpha):
+  ## value (for the side to move) of one root move, searched in the window (alpha, inf)
+  undo = game.makeSearchMove(move, player_sgn)
+  value = -negamax(game, -player_sgn, -math.inf, -alpha, 1)[0]
+  game.unmakeSearchMove(move, player_sgn, undo)
+  return value
+
+def searchRootSplit(game, player_sgn, list_moves, executor, worker_function, worker_args=()):
+  ## root-split version of `negamax` at the root: the first move is searched here to get
+  ## an alpha bound (young brothers wait), then the others are spread over the process
+  ## pool, each searched with the best value known when it is handed out. returns
+  ## (value, best move), and keeps the first of equally good moves like `negamax`.
+  from concurrent.futures import wait, FIRST_COMPLETED
+  game.num_nodes += 1
+  best_value = searchRootMove(game, player_sgn, list_moves[0], -math.inf)
+  best_index = 0
+  list_bounded = []
+  dict_pending = {}
+  next_index = 1
+  while (next_index < len(list_moves)) or (len(dict_pending) > 0):
+    while (next_index < len(list_moves)) and (len(dict_pending) < executor._max_workers):
+      future = executor.submit(worker_function, *worker_args, player_sgn, list_moves[next_index], best_value)
+      dict_pending[future] = (next_index, best_value)
+      next_index += 1
+    set_done, _ = wait(dict_pending, return_when=FIRST_COMPLETED)
+    for future in set_done:
+      move_index, alpha = dict_pending.pop(future)
+      value, num_nodes = future.result()
+      game.num_nodes += num_nodes
+      ## a value at or below alpha is only an upper bound
+      if game.bool_alpha_beta and (value <= alpha):
+        list_bounded.append((move_index, alpha))
+      elif (value > best_value) or ((value == best_value) and (move_index < best_index)):
+        best_value, best_index = value, move_index
+  ## earlier moves that were only bounded by the best value may tie with it, so they
+  ## are searched again
+  for move_index, alpha in sorted(list_bounded):
+    if (move_index < best_index) and (alpha == best_value):
+      if searchRootMove(game, player_sgn, list_moves[move_index], -math.inf) == best_value:
+        best_index = move_index
+        break
+  return best_value, list_moves[best_index]
+
+
+## ###################
+## SEARCH BUDGET
+## ###################
+class SearchBudget():
+  ## limits of a bounded search (`negamaxStack`): at most `max_nodes` nodes, and at most
+  ## `max_memory` bytes resident in the process, read every `memory_interval` nodes.
+  ## a limit of None is not checked. a budget can be spent over several searches, e.g.
+  ## the iterations of an iterative deepening search.
+  def __init__(self, max_nodes=None, max_memory=None, memory_interval=MEMORY_INTERVAL):
+    self.max_nodes = max_nodes
+    self.max_memory = max_memory
+    self.memory_interval = memory_interval
+    self.num_nodes = 0
+    self.num_until_memory = 0
+    self.bool_exhausted = False
+
+  def spendNode(self):
+    ## count one node: True once the budget has run out
+    if self.bool_exhausted:
+      return True
+    if (self.max_nodes is not None) and (self.num_nodes >= self.max_nodes):
+      self.bool_exhausted = True
+      return True
+    if self.max_memory is not None:
+      self.num_until_memory -= 1
+      if self.num_until_memory <= 0:
+        self.num_until_memory = self.memory_interval
+        memory = getResidentMemory()
+        if (memory is not None) and (memory > self.max_memory):
+          self.bool_exhausted = True
+          return True
+    self.num_nodes += 1
+    return False
+
+def getResidentMemory():
+  ## bytes of memory resident in this process (the peak where only that is available,
+  ## None where neither is)
+  try:
+    with open("/proc/self/statm") as statm_file:
+      return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, ValueError, AttributeError):
+    pass
+  try:
+    import resource
+  except ImportError:
+    return None
+  peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak_memory if (sys.platform == "darwin") else 1024 * peak_memory
+
+
+## END OF PROGRAM
@@ -0,0 +1,282 @@
+import sys, json, time, random, argparse
+import numpy as np
+import tictactoe_v1 as v1
+import tictactoe_v2 as v2
+import tictactoe_v2_mcts as v2_mcts
+
+
+## ###################
+## GAME RULES
+## ###################
+## moves are (cell_index, piece_index) pairs, with cell_index = 3*y + x. v1 has no
+## piece sizes, so its piece_index is always None.
+class RulesV1():
+  name = "v1"
+
+  def createGame(self):
+    ## searches are timed and counted, so they must not be answered from the search cache
+    game = v1.TicTacToe()
+    game.search_cache = None
+    return game
+
+  def hasPieces(self, game, player_sgn):
+    return True
+
+  def getLegalMoves(self, game, player_sgn):
+    mask_free = v1.FULL_MASK & ~(game.mask_p1 | game.mask_p2)
+    return [(cell_index, None) for cell_index in range(9) if (mask_free >> cell_index) & 1]
+
+  def makeMove(self, game, move, player_sgn):
+    game.makeMove(move[0], player_sgn)
+
+  def searchMove(self, game, player_sgn, max_depth):
+    ## v1 always searches to the end of the game
+    if player_sgn > 0:
+      _, (row_index, col_index) = game.min(-np.inf, np.inf)
+    else: _, (row_index, col_index) = game.max(-np.inf, np.inf)
+    if row_index is None:
+      return None
+    return (3*row_index + col_index, None)
+
+  def lookupMove(self, game, player_sgn):
+    result = game.lookupBook()
+    if (result is None) or (result[1][0] is None):
+      return None
+    _, (row_index, col_index) = result
+    return (3*row_index + col_index, None)
+
+  def getMoveRecord(self, game, move):
+    return {"cell": move[0]}
+
+
+class RulesV2():
+  name = "v2"
+
+  def createGame(self):
+    game = v2.TicTacToe()
+    game.search_cache = None
+    return game
+
+  def hasPieces(self, game, player_sgn):
+    return (game.pieces_p1 if (player_sgn > 0) else game.pieces_p2) != 0
+
+  def getLegalMoves(self, game, player_sgn):
+    return game.getLegalMoves(player_sgn)
+
+  def makeMove(self, game, move, player_sgn):
+    game.makeMove(move[0], move[1], player_sgn)
+
+  def searchMove(self, game, player_sgn, max_depth):
+    game.max_depth = v2.MAX_DEPTH if (max_depth is None) else max_depth
+    if player_sgn > 0:
+      _, (x, y), piece_index = game.min(-np.inf, np.inf, 0)
+    else: _, (x, y), piece_index = game.max(-np.inf, np.inf, 0)
+    game.max_depth = v2.MAX_DEPTH
+    if x is None:
+      return None
+    return (3*y + x, piece_index)
+
+  def lookupMove(self, game, player_sgn):
+    result = game.lookupSolvedTable(player_sgn)
+    if result is None:
+      return None
+    _, (x, y), piece_index = result
+    return (3*y + x, piece_index)
+
+  def getMoveRecord(self, game, move):
+    return {"cell": move[0], "size": move[1] + 1}
+
+DICT_RULES = {"v1": RulesV1, "v2": RulesV2}
+
+
+## ###################
+## AGENTS
+## ###################
+## an agent returns a legal move for the side to move, or None if it has none
+class RandomAgent():
+  name = "random"
+
+  def __init__(self, seed=None):
+    self.rng = random.Random(seed)
+
+  def chooseMove(self, rules, game, player_sgn):
+    list_moves = rules.getLegalMoves(game, player_sgn)
+    if len(list_moves) == 0:
+      return None
+    return self.rng.choice(list_moves)
+
+
+class MinimaxAgent():
+  name = "minimax"
+
+  def __init__(self, max_depth=None):
+    self.max_depth = max_depth
+
+  def chooseMove(self, rules, game, player_sgn):
+    return rules.searchMove(game, player_sgn, self.max_depth)
+
+
+class BookAgent():
+  ## plays from the v1 book / v2 solved-game table, and searches positions they do not cover
+  name = "book"
+
+  def __init__(self, max_depth=None):
+    self.max_depth = max_depth
+
+  def chooseMove(self, rules, game, player_sgn):
+    move = rules.lookupMove(game, player_sgn)
+    if move is None:
+      move = rules.searchMove(game, player_sgn, self.max_depth)
+    return move
+
+
+class MCTSAgent():
+  ## v2 only: Monte Carlo tree search, keeping its tree between moves
+  name = "mcts"
+
+  def __init__(self, seed=None, num_simulations=v2_mcts.NUM_SIMULATIONS):
+    self.engine = v2_mcts.MonteCarloTreeSearch(num_simulations=num_simulations, seed=seed)
+
+  def chooseMove(self, rules, game, player_sgn):
+    if rules.name != "v2":
+      raise Exception("The MCTS agent only plays the v2 rules.")
+    _, (x, y), piece_index = self.engine.search(game, player_sgn)
+    if x is None:
+      return None
+    return (3*y + x, piece_index)
+
+  def close(self):
+    self.engine.close()
+
+def createAgent(agent_name, seed=None, max_depth=None, num_simulations=v2_mcts.NUM_SIMULATIONS):
+  if agent_name == "random":
+    return RandomAgent(seed)
+  if agent_name == "minimax":
+    return MinimaxAgent(max_depth)
+  if agent_name == "book":
+    return BookAgent(max_depth)
+  if agent_name == "mcts":
+    return MCTSAgent(seed, num_simulations)
+  raise Exception(f"Unknown agent: {agent_name}")
+
+
+## ###################
+## GAME RUNNER
+## ###################
+def playGame(rules, game, agent_p1, agent_p2):
+  ## play one game without any terminal i/o, and return its record. the player (+1)
+  ## always moves first. a side that still has pieces but no legal move loses.
+  game.initialise()
+  list_moves = []
+  player_sgn = 1
+  while True:
+    status = game.checkGameOverStatus()
+    if status is not None:
+      break
+    if not rules.hasPieces(game, player_sgn):
+      player_sgn = -player_sgn
+      continue
+    agent = agent_p1 if (player_sgn > 0) else agent_p2
+    game.resetSearchCounters()
+    time_start = time.perf_counter()
+    move = agent.chooseMove(rules, game, player_sgn)
+    time_elapsed = time.perf_counter() - time_start
+    if move is None:
+      status = -player_sgn
+      break
+    rules.makeMove(game, move, player_sgn)
+    list_moves.append({
+      "player": player_sgn,
+      **rules.getMoveRecord(game, move),
+      "time": time_elapsed,
+      "nodes": game.num_nodes
+    })
+    player_sgn = -player_sgn
+  return {
+    "rules": rules.name,
+    "player_1": agent_p1.name,
+    "player_2": agent_p2.name,
+    "outcome": int(status),
+    "moves": list_moves
+  }
+
+def runGames(num_games, agent_p1, agent_p2, rules_name="v2"):
+  ## generator: streams the record of each game as soon as it has been played
+  rules = DICT_RULES[rules_name]()
+  game = rules.createGame()
+  for _ in range(num_games):
+    yield playGame(rules, game, agent_p1, agent_p2)
+
+class ThroughputMeter():
+  ## accumulates game records into games per second and (searched) nodes per second
+  def __init__(self):
+    self.time_start = time.perf_counter()
+    self.num_games = 0
+    self.num_moves = 0
+    self.num_nodes = 0
+    self.time_search = 0.0
+    self.dict_outcomes = {1: 0, -1: 0, 0: 0}
+
+  def update(self, dict_record):
+    self.num_games += 1
+    self.dict_outcomes[dict_record["outcome"]] += 1
+    for dict_move in dict_record["moves"]:
+      self.num_moves += 1
+      self.num_nodes += dict_move["nodes"]
+      self.time_search += dict_move["time"]
+
+  def getSummary(self):
+    time_elapsed = time.perf_counter() - self.time_start
+    return {
+      "games": self.num_games,
+      "moves": self.num_moves,
+      "nodes": self.num_nodes,
+      "seconds": time_elapsed,
+      "games_per_second": self.num_games / time_elapsed if (time_elapsed > 0) else 0.0,
+      "nodes_per_second": self.num_nodes / self.time_search if (self.time_search > 0) else 0.0,
+      "player_1_wins": self.dict_outcomes[1],
+      "player_2_wins": self.dict_outcomes[-1],
+      "ties": self.dict_outcomes[0]
+    }
+
+
+## ###################
+## DEFINE MAIN PROGRAM
+## ###################
+def main():
+  parser = argparse.ArgumentParser(description="Play tic-tac-toe games between AI agents, without a terminal.")
+  parser.add_argument("--rules", choices=sorted(DICT_RULES), default="v2")
+  parser.add_argument("--games", type=int, default=10)
+  parser.add_argument("--p1", choices=["minimax", "random", "book", "mcts"], default="random")
+  parser.add_argument("--p2", choices=["minimax", "random", "book", "mcts"], default="minimax")
+  parser.add_argument("--depth", type=int, default=None, help="v2 search depth (default: MAX_DEPTH)")
+  parser.add_argument("--simulations", type=int, default=v2_mcts.NUM_SIMULATIONS, help="MCTS simulations per move")
+  parser.add_argument("--seed", type=int, default=None)
+  parser.add_argument("--output", default=None, help="write game records (JSON lines) to this file")
+  args = parser.parse_args()
+  agent_p1 = createAgent(args.p1, args.seed, args.depth, args.simulations)
+  agent_p2 = createAgent(args.p2, None if (args.seed is None) else args.seed + 1, args.depth, args.simulations)
+  meter = ThroughputMeter()
+  output_file = open(args.output, "w") if (args.output is not None) else None
+  try:
+    for dict_record in runGames(args.games, agent_p1, agent_p2, args.rules):
+      meter.update(dict_record)
+      if output_file is not None:
+        output_file.write(json.dumps(dict_record) + "\n")
+  finally:
+    if output_file is not None:
+      output_file.close()
+    for agent in (agent_p1, agent_p2):
+      if isinstance(agent, MCTSAgent):
+        agent.close()
+  print(json.dumps(meter.getSummary()), file=sys.stderr)
+
+
+## ###################
+## RUN MAIN
+## ###################
+if __name__ == "__main__":
+  main()
+
+
+## END OF PROGRAM
@@ -0,0 +1,205 @@
+import os, json, socket, asyncio, argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from tictactoe_analyse import parsePosition, canonicalizePosition, restoreResult, initialiseWorker, analysePositions
+
+
+## ###################
+## PROGRAM PARAMETERS
+## ###################
+HOST         = "127.0.0.1"
+PORT         = 8765
+NUM_WORKERS  = os.cpu_count() or 1 ## search processes (0: a single thread in the server process)
+BATCH_SIZE   = 32 ## most positions handed to the workers at once
+BATCH_WINDOW = 0.005 ## seconds to wait for more requests before a batch is sent
+CACHE_SIZE   = 1 << 16 ## analysed positions kept (least recently used ones are dropped)
+
+
+## ###################
+## PROTOCOL
+## ###################
+## one JSON object per line, in both directions. a request holds the position:
+##   {"id": 1, "rules": "v1", "board": [[0, 0, 0], [0, 1, 0], [0, 0, 0]]}
+##   {"id": 2, "rules": "v2", "board": [[...]], "pieces_p1": [1, 1, 0, 1, 1], "pieces_p2": [1, 1, 1, 1, 1], "depth": 5}
+## boards hold signed piece sizes (player > 0, AI < 0), and the side to move ("player")
+## follows from the position unless it is given (see `tictactoe_analyse.parsePosition`).
+## the reply echoes the id and gives the best move for the side to move, and its score
+## for the AI:
+##   {"id": 1, "score": 0, "move": {"x": 0, "y": 0, "size": null}, "cached": false}
+## or {"id": ..., "error": "..."} for an invalid request.
+
+
+## ###################
+## SERVER
+## ###################
+class AnalysisServer():
+  ## positions are reduced to their canonical symmetry, and requests are answered from
+  ## the cache, or joined to an equivalent position that is already queued or being
+  ## searched. new positions are collected for `batch_window` seconds (or until
+  ## `batch_size` of them wait), and each batch is searched in the worker pool while the
+  ## event loop keeps serving clients.
+  def __init__(self, num_workers=NUM_WORKERS, batch_size=BATCH_SIZE, batch_window=BATCH_WINDOW, cache_size=CACHE_SIZE):
+    self.num_workers = num_workers
+    self.batch_size = batch_size
+    self.batch_window = batch_window
+    self.cache_size = cache_size
+    self.dict_cache = OrderedDict()
+    self.dict_pending = {}
+    self.queue_positions = None
+    self.executor = None
+    self.set_tasks = set()
+
+  def getCached(self, position):
+    dict_result = self.dict_cache.get(position)
+    if dict_result is not None:
+      self.dict_cache.move_to_end(position)
+    return dict_result
+
+  def storeCached(self, position, dict_result):
+    self.dict_cache[position] = dict_result
+    self.dict_cache.move_to_end(position)
+    while len(self.dict_cache) > self.cache_size:
+      self.dict_cache.popitem(last=False)
+
+  async def analyse(self, position):
+    ## (result, cached) for one position
+    dict_result = self.getCached(position)
+    if dict_result is not None:
+      return dict_result, True
+    future = self.dict_pending.get(position)
+    if future is None:
+      future = asyncio.get_running_loop().create_future()
+      self.dict_pending[position] = future
+      await self.queue_positions.put(position)
+    return await asyncio.shield(future), False
+
+  async def runBatches(self):
+    loop = asyncio.get_running_loop()
+    while True:
+      list_positions = [await self.queue_positions.get()]
+      time_deadline = loop.time() + self.batch_window
+      while len(list_positions) < self.batch_size:
+        time_left = time_deadline - loop.time()
+        if time_left <= 0:
+          break
+        try:
+          list_positions.append(await asyncio.wait_for(self.queue_positions.get(), time_left))
+        except asyncio.TimeoutError:
+          break
+      ## the search runs in the background, so the next batch can be collected meanwhile
+      task = asyncio.create_task(self.searchBatch(list_positions))
+      self.set_tasks.add(task)
+      task.add_done_callback(self.set_tasks.discard)
+
+  async def searchBatch(self, list_positions):
+    ## one chunk of the batch per worker
+    loop = asyncio.get_running_loop()
+    num_chunks = max(1, min(self.num_workers, len(list_positions)))
+    try:
+      list_chunk_results = await asyncio.gather(*[
+        loop.run_in_executor(self.executor, analysePositions, list_positions[chunk_index::num_chunks])
+        for chunk_index in range(num_chunks)
+      ])
+    except Exception as error:
+      for position in list_positions:
+        future = self.dict_pending.pop(position)
+        if not future.done():
+          future.set_exception(error)
+      return
+    list_results = [None] * len(list_positions)
+    for chunk_index, list_chunk in enumerate(list_chunk_results):
+      list_results[chunk_index::num_chunks] = list_chunk
+    for position, dict_result in zip(list_positions, list_results):
+      self.storeCached(position, dict_result)
+      future = self.dict_pending.pop(position)
+      if not future.done():
+        future.set_result(dict_result)
+
+  async def handleRequest(self, line, writer):
+    dict_reply = {}
+    try:
+      dict_request = json.loads(line)
+      dict_reply["id"] = dict_request.get("id")
+      position, sym_index = canonicalizePosition(parsePosition(dict_request))
+      dict_result, bool_cached = await self.analyse(position)
+      dict_reply.update(restoreResult(dict_result, sym_index))
+      dict_reply["cached"] = bool_cached
+    except Exception as error:
+      dict_reply["error"] = f"{type(error).__name__}: {error}"
+    writer.write((json.dumps(dict_reply) + "\n").encode())
+    await writer.drain()
+
+  async def handleClient(self, reader, writer):
+    ## requests of one connection are answered as they complete (match them by id)
+    list_tasks = []
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        if line.strip():
+          list_tasks.append(asyncio.create_task(self.handleRequest(line, writer)))
+      await asyncio.gather(*list_tasks)
+    finally:
+      writer.close()
+
+  async def serve(self, host=HOST, port=PORT):
+    self.queue_positions = asyncio.Queue()
+    if self.num_workers > 0:
+      self.executor = ProcessPoolExecutor(self.num_workers, initializer=initialiseWorker)
+    else: self.executor = ThreadPoolExecutor(1, initializer=initialiseWorker)
+    ## start the workers before listening: processes forked later would inherit open client
+    ## connections, and keep them open after the server closes them
+    await asyncio.get_running_loop().run_in_executor(self.executor, analysePositions, [])
+    batch_task = asyncio.create_task(self.runBatches())
+    server = await asyncio.start_server(self.handleClient, host, port)
+    print(f"Serving position analysis on {host}:{port}.", flush=True)
+    try:
+      async with server:
+        await server.serve_forever()
+    finally:
+      batch_task.cancel()
+      self.executor.shutdown()
+
+
+## ###################
+## CLIENT
+## ###################
+def requestAnalysis(list_requests, host=HOST, port=PORT):
+  ## blocking helper for other programs: send requests, and return the replies in order
+  with socket.create_connection((host, port)) as client:
+    client.sendall("".join([json.dumps({**dict_request, "id": request_index}) + "\n" for request_index, dict_request in enumerate(list_requests)]).encode())
+    client.shutdown(socket.SHUT_WR)
+    with client.makefile() as reply_file:
+      list_replies = [json.loads(line) for line in reply_file]
+  list_replies.sort(key=lambda dict_reply: dict_reply.get("id", -1))
+  return list_replies
+
+
+## ###################
+## DEFINE MAIN PROGRAM
+## ###################
+def main():
+  parser = argparse.ArgumentParser(description="Serve best moves and scores for tic-tac-toe positions on localhost.")
+  parser.add_argument("--host", default=HOST)
+  parser.add_argument("--port", type=int, default=PORT)
+  parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="search processes (0: one thread)")
+  parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+  parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW, help="seconds")
+  parser.add_argument("--cache-size", type=int, default=CACHE_SIZE)
+  args = parser.parse_args()
+  server = AnalysisServer(args.workers, args.batch_size, args.batch_window, args.cache_size)
+  try:
+    asyncio.run(server.serve(args.host, args.port))
+  except KeyboardInterrupt:
+    pass
+
+
+## ###################
+## RUN MAIN
+## ###################
+if __name__ == "__main__":
+  main()
+
+
+## END OF PROGRAM
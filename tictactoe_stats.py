@@ -0,0 +1,114 @@
+import time
+
+
+## ###################
+## SEARCH STATISTICS
+## ###################
+class SearchStats():
+  ## counters collected by `max`/`min` while `game.stats` is set (it is None, and costs
+  ## nothing beyond one attribute check per node, otherwise). every counter is kept per
+  ## depth (distance from the root). when `sample_interval` is positive, every
+  ## `sample_interval`-th node records a (seconds, nodes, depth) sample and calls
+  ## `sample_hook(stats, depth)`, e.g. to snapshot the stack from a profiler.
+  __slots__ = (
+    "list_nodes", "list_cutoffs", "list_terminal", "list_table_hits",
+    "sample_interval", "sample_hook", "list_samples", "num_sampled",
+    "time_start", "time_elapsed"
+  )
+
+  def __init__(self, sample_interval=0, sample_hook=None):
+    self.list_nodes      = []
+    self.list_cutoffs    = []
+    self.list_terminal   = []
+    self.list_table_hits = []
+    self.sample_interval = sample_interval
+    self.sample_hook     = sample_hook
+    self.list_samples    = []
+    self.num_sampled     = 0
+    self.time_start      = None
+    self.time_elapsed    = 0.0
+
+  def start(self):
+    self.time_start = time.perf_counter()
+
+  def stop(self):
+    if self.time_start is not None:
+      self.time_elapsed += time.perf_counter() - self.time_start
+      self.time_start = None
+
+  def countNode(self, depth):
+    ## every node is counted first, so this is where the per-depth counters grow
+    if depth >= len(self.list_nodes):
+      num_missing = depth + 1 - len(self.list_nodes)
+      self.list_nodes      += [0] * num_missing
+      self.list_cutoffs    += [0] * num_missing
+      self.list_terminal   += [0] * num_missing
+      self.list_table_hits += [0] * num_missing
+    self.list_nodes[depth] += 1
+    if self.sample_interval > 0:
+      self.num_sampled += 1
+      if self.num_sampled >= self.sample_interval:
+        self.num_sampled = 0
+        self.takeSample(depth)
+
+  def takeSample(self, depth):
+    time_now = time.perf_counter()
+    seconds = self.time_elapsed + ((time_now - self.time_start) if (self.time_start is not None) else 0.0)
+    self.list_samples.append((seconds, self.num_nodes, depth))
+    if self.sample_hook is not None:
+      self.sample_hook(self, depth)
+
+  def countCutoff(self, depth):
+    self.list_cutoffs[depth] += 1
+
+  def countTerminal(self, depth):
+    self.list_terminal[depth] += 1
+
+  def countTableHit(self, depth):
+    self.list_table_hits[depth] += 1
+
+  @property
+  def num_nodes(self):
+    return sum(self.list_nodes)
+
+  @property
+  def num_cutoffs(self):
+    return sum(self.list_cutoffs)
+
+  @property
+  def num_terminal(self):
+    return sum(self.list_terminal)
+
+  @property
+  def num_table_hits(self):
+    return sum(self.list_table_hits)
+
+  @property
+  def nodes_per_second(self):
+    if self.time_elapsed <= 0:
+      return 0.0
+    return self.num_nodes / self.time_elapsed
+
+  def toDict(self):
+    return {
+      "nodes": self.num_nodes,
+      "cutoffs": self.num_cutoffs,
+      "terminal": self.num_terminal,
+      "table_hits": self.num_table_hits,
+      "seconds": self.time_elapsed,
+      "nodes_per_second": self.nodes_per_second,
+      "per_depth": [
+        {
+          "depth": depth,
+          "nodes": self.list_nodes[depth],
+          "cutoffs": self.list_cutoffs[depth],
+          "terminal": self.list_terminal[depth],
+          "table_hits": self.list_table_hits[depth]
+        }
+        for depth in range(len(self.list_nodes))
+      ],
+      "samples": list(self.list_samples)
+    }
+
+
+## END OF PROGRAM
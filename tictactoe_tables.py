@@ -0,0 +1,123 @@
+## precomputed 3x3 board tables shared by the engines, caches and analysis tools. cell
+## (x, y) is cell index 3*y + x, and bit (3*y + x) of a 9-bit mask. importing this
+## module has no side effects: numpy is only imported by `canonicalizeBatch`.
+
+
+## ###################
+## LINE TABLES
+## ###################
+FULL_MASK = 0b111111111
+LIST_WIN_MASKS = [
+  0b000000111, 0b000111000, 0b111000000, ## rows
+  0b001001001, 0b010010010, 0b100100100, ## columns
+  0b100010001, 0b001010100               ## diagonals
+]
+## cell indices of each winning line
+LIST_LINE_INDICES = [
+  [cell_index for cell_index in range(9) if (win_mask >> cell_index) & 1]
+  for win_mask in LIST_WIN_MASKS
+]
+## line indices (into LIST_WIN_MASKS) and winning lines through each cell
+LIST_CELL_LINES = [
+  [line_index for line_index, win_mask in enumerate(LIST_WIN_MASKS) if (win_mask >> cell_index) & 1]
+  for cell_index in range(9)
+]
+LIST_CELL_WIN_MASKS = [
+  [LIST_WIN_MASKS[line_index] for line_index in list_lines]
+  for list_lines in LIST_CELL_LINES
+]
+## cell indices of every mask, and whether it holds a complete line
+LIST_MASK_CELLS = [
+  tuple(cell_index for cell_index in range(9) if (mask >> cell_index) & 1)
+  for mask in range(FULL_MASK + 1)
+]
+LIST_IS_WIN = [
+  any((mask & win_mask) == win_mask for win_mask in LIST_WIN_MASKS)
+  for mask in range(FULL_MASK + 1)
+]
+
+
+## ###################
+## SYMMETRY TABLES
+## ###################
+## the 8 board symmetries: symmetry s moves the piece in cell c to cell LIST_SYMMETRIES[s][c],
+## so the transformed board holds the piece of cell LIST_SYMMETRIES_INV[s][c] in cell c
+LIST_SYMMETRIES = [
+  [3*y + x       for y in range(3) for x in range(3)], ## identity
+  [3*x + (2-y)   for y in range(3) for x in range(3)], ## rotate 90
+  [3*(2-y) + 2-x for y in range(3) for x in range(3)], ## rotate 180
+  [3*(2-x) + y   for y in range(3) for x in range(3)], ## rotate 270
+  [3*y + (2-x)   for y in range(3) for x in range(3)], ## mirror x
+  [3*(2-y) + x   for y in range(3) for x in range(3)], ## mirror y
+  [3*x + y       for y in range(3) for x in range(3)], ## transpose
+  [3*(2-x) + 2-y for y in range(3) for x in range(3)]  ## anti-transpose
+]
+LIST_SYMMETRIES_INV = [
+  [list_perm.index(cell_index) for cell_index in range(9)]
+  for list_perm in LIST_SYMMETRIES
+]
+## every 9-bit mask under each symmetry
+LIST_MASK_SYMMETRIES = [
+  [sum(1 << list_perm[cell_index] for cell_index in LIST_MASK_CELLS[mask]) for mask in range(FULL_MASK + 1)]
+  for list_perm in LIST_SYMMETRIES
+]
+## every 9-bit mask under each symmetry, as the base-3 number with a 1 digit in each
+## of its (transformed) cells, read from cell 0 down
+LIST_MASK_WEIGHTS = [
+  [sum(3 ** (8 - list_perm[cell_index]) for cell_index in LIST_MASK_CELLS[mask]) for mask in range(FULL_MASK + 1)]
+  for list_perm in LIST_SYMMETRIES
+]
+
+
+## ###################
+## CANONICAL POSITIONS
+## ###################
+## the canonical form of a position is its smallest transform over the 8 symmetries,
+## comparing cell values from cell 0 down (as tuples compare), returned with the index
+## of the first symmetry that gives it. all three functions below pick the same form. a move (cell) of the canonical position is
+## cell LIST_SYMMETRIES_INV[s][cell] of the original one, and a cell c of the original
+## is cell LIST_SYMMETRIES[s][c] of the canonical one.
+def canonicalizeMasks(mask_p1, mask_p2):
+  ## bitboards: (canonical mask_p1, canonical mask_p2, symmetry index). cells compare
+  ## like board values: mask_p1 pieces as 1, mask_p2 pieces as -1 and free cells as 0
+  best_key = None
+  best_sym_index = 0
+  for sym_index, list_weights in enumerate(LIST_MASK_WEIGHTS):
+    key = list_weights[mask_p1] - list_weights[mask_p2]
+    if (best_key is None) or (key < best_key):
+      best_key = key
+      best_sym_index = sym_index
+  list_mask_sym = LIST_MASK_SYMMETRIES[best_sym_index]
+  return list_mask_sym[mask_p1], list_mask_sym[mask_p2], best_sym_index
+
+def canonicalizeCells(cells):
+  ## 9 cell values (any comparable values): (canonical tuple of cells, symmetry index)
+  list_transforms = [
+    tuple(cells[cell_index] for cell_index in list_inv)
+    for list_inv in LIST_SYMMETRIES_INV
+  ]
+  best_cells = min(list_transforms)
+  return best_cells, list_transforms.index(best_cells)
+
+def canonicalizeBatch(array_cells):
+  ## N positions at once, as an (N,9) or (N,3,3) array of integer cell values. a position
+  ## is compared as the number whose digits are its cells, read from cell 0 down, so
+  ## the 8 transforms of every position are scored by a single product with a (9,8)
+  ## table of digit weights, and only the smallest is gathered. returns the (N,9)
+  ## canonical cells and the (N,) symmetry indices.
+  import numpy as np
+  array_cells = np.asarray(array_cells).reshape(-1, 9)
+  if len(array_cells) == 0:
+    return array_cells.copy(), np.zeros(0, dtype=np.int64)
+  value_low = int(array_cells.min())
+  base = int(array_cells.max()) - value_low + 1
+  if base ** 9 > (1 << 53):
+    raise ValueError("The cell values span too wide a range to be compared exactly.")
+  ## cell c of a position is cell LIST_SYMMETRIES[s][c] of its transform s
+  array_weights = float(base) ** (8 - np.array(LIST_SYMMETRIES).T)
+  array_keys = (array_cells.astype(np.float64) - value_low) @ array_weights
+  array_sym_indices = np.argmin(array_keys, axis=1)
+  array_gather = np.array(LIST_SYMMETRIES_INV)[array_sym_indices]
+  return np.take_along_axis(array_cells, array_gather, axis=1), array_sym_indices
+
+## END OF PROGRAM
@@ -0,0 +1,71 @@
+import os, atexit, queue, threading
+
+
+## ###################
+## SEARCH TRACE LOG
+## ###################
+class TraceLog():
+  ## buffered, size-rotated search trace. `record(formatter, *args)` only appends a tuple
+  ## to an in-memory buffer; full buffers are handed to a background thread, which turns
+  ## each record into text (`formatter(*args)`), writes them in one go, and rotates the
+  ## file once it exceeds `max_bytes` (`file_path` -> `file_path.1` -> ... up to
+  ## `num_backups` old files). the arguments of a record must not be mutated afterwards.
+  def __init__(self, file_path, max_bytes=64 << 20, num_backups=3, buffer_size=1 << 14):
+    self.file_path   = file_path
+    self.max_bytes   = max_bytes
+    self.num_backups = num_backups
+    self.buffer_size = buffer_size
+    self.list_records = []
+    self.queue_batches = queue.Queue()
+    self.txt_file = open(file_path, "w")
+    self.thread = threading.Thread(target=self.writeBatches, daemon=True)
+    self.thread.start()
+    atexit.register(self.close)
+
+  def record(self, formatter, *args):
+    self.list_records.append((formatter, args))
+    if len(self.list_records) >= self.buffer_size:
+      self.flush()
+
+  def flush(self):
+    ## hand the buffered records over to the writer thread
+    if len(self.list_records) > 0:
+      self.queue_batches.put(self.list_records)
+      self.list_records = []
+
+  def close(self):
+    ## write out everything that is still buffered, and stop the writer thread
+    if self.thread is None:
+      return
+    self.flush()
+    self.queue_batches.put(None)
+    self.thread.join()
+    self.thread = None
+    self.txt_file.close()
+    atexit.unregister(self.close)
+
+  def writeBatches(self):
+    while True:
+      list_records = self.queue_batches.get()
+      if list_records is None:
+        return
+      self.txt_file.write("".join([
+        formatter(*args) + "\n"
+        for formatter, args in list_records
+      ]))
+      self.txt_file.flush()
+      if self.txt_file.tell() >= self.max_bytes:
+        self.rotate()
+
+  def rotate(self):
+    self.txt_file.close()
+    if self.num_backups > 0:
+      for backup_index in range(self.num_backups - 1, 0, -1):
+        backup_path = f"{self.file_path}.{backup_index}"
+        if os.path.exists(backup_path):
+          os.replace(backup_path, f"{self.file_path}.{backup_index + 1}")
+      os.replace(self.file_path, f"{self.file_path}.1")
+    self.txt_file = open(self.file_path, "w")
+
+
+## END OF PROGRAM
@@ -1,25 +1,178 @@
-import os, time
-import numpy as np
-os.system("clear")
+## importing this module has no side effects: numpy and concurrent.futures are only
+## imported by the functions that use them
+import os, math, time, mmap
+from tictactoe_stats import SearchStats
+from tictactoe_negamax import negamax, getExecutor, searchRootMove, searchRootSplit
+from tictactoe_cache import SearchCache
+## cell (row, col) is stored in bit (3*row + col) of a 9-bit mask
+from tictactoe_tables import (
+  FULL_MASK, LIST_LINE_INDICES, LIST_MASK_CELLS, LIST_IS_WIN,
+  LIST_SYMMETRIES, LIST_SYMMETRIES_INV, canonicalizeMasks, canonicalizeCells, canonicalizeBatch
+)
 
 
 ## ###########################
 ## PROGRAM PARAMETERS
 ## ###########################
 BOOL_ALPHA_BETA = 1
+BOOL_PVS        = 0 ## without move ordering, most null-window searches would be repeated
+BOOL_BOOK       = 1
+BOOL_CACHE      = 0 ## opt in to keep root search results on disk between sessions
+BOOL_PARALLEL   = 0
+NUM_WORKERS     = os.cpu_count() or 1 ## processes used by the parallel (root-split) search
+BOOK_PATH       = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tictactoe_v1_book.bin")
+CACHE_PATH      = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tictactoe_v1_cache.sqlite")
+CACHE_VERSION   = 2 ## increase when the search changes, to drop older cached results
+
+
+## ###########################
+## BATCH EVALUATION
+## ###########################
+## batch status of a board where the game has not concluded (`None` for a single board)
+STATUS_ONGOING = 2
+
+def checkGameOverStatusBatch(array_boards):
+  ## status of N boards at once, given as an (N,3,3) or (N,9) array: 1 if the player
+  ## won, -1 if the AI won, 0 if it is a tie, and STATUS_ONGOING otherwise
+  import numpy as np
+  array_cells = np.sign(np.asarray(array_boards).reshape(-1, 9)).astype(np.int8)
+  array_line_sums = array_cells[:, LIST_LINE_INDICES].sum(axis=2)
+  array_status = np.where(np.all(array_cells != 0, axis=1), 0, STATUS_ONGOING).astype(np.int8)
+  array_status[np.any(array_line_sums == -3, axis=1)] = -1
+  array_status[np.any(array_line_sums == 3, axis=1)] = 1
+  return array_status
+
+
+## ###########################
+## PERFECT-PLAY BOOK
+## ###########################
+## every position is stored in one byte at its base-3 index (cell digit: 0 free,
+## 1 'x', 2 'o'). the low nibble holds the best move's cell index for the side to
+## move, and the high nibble holds the (AI's) perfect-play score plus one.
+BOOK_NUM_POSITIONS = 3**9
+BOOK_UNREACHABLE   = 0xFF
+BOOK_NO_MOVE       = 0x0F
+LIST_BASE3_OFFSETS = [
+  sum(3**cell_index for cell_index in range(9) if (mask >> cell_index) & 1)
+  for mask in range(FULL_MASK + 1)
+]
+
+def getBookIndex(mask_p1, mask_p2):
+  return LIST_BASE3_OFFSETS[mask_p1] + 2*LIST_BASE3_OFFSETS[mask_p2]
+
+def encodeBookEntry(score, cell_index):
+  if cell_index is None:
+    cell_index = BOOK_NO_MOVE
+  return ((score + 1) << 4) | cell_index
+
+def decodeBookEntry(entry):
+  cell_index = entry & 0x0F
+  if cell_index == BOOK_NO_MOVE:
+    cell_index = None
+  return (entry >> 4) - 1, cell_index
+
+def loadBook(file_path=BOOK_PATH):
+  ## memory-map the table written by `tictactoe_v1_book.py` (None if it has not been generated)
+  if not os.path.isfile(file_path):
+    return None
+  with open(file_path, "rb") as book_file:
+    book = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+  if len(book) != BOOK_NUM_POSITIONS:
+    book.close()
+    return None
+  return book
 
 
 ## ###########################
 ## GAME CLASS
 ## ###########################
 class TicTacToe():
+  ## `tictactoe_negamax` searches the whole game tree
+  bool_alpha_beta = BOOL_ALPHA_BETA
+  bool_pvs        = BOOL_PVS
+
   def __init__(self):
-    self.tests()
     self.initialise()
+    self.book = loadBook() if BOOL_BOOK else None
+    ## root search results of earlier sessions (None: not used)
+    self.search_cache = SearchCache(CACHE_PATH, CACHE_VERSION) if BOOL_CACHE else None
+    self.executor = None
+    ## detailed search statistics: only collected while `searchWithStats` runs
+    self.stats = None
 
   def initialise(self):
     self.depth = 0
-    self.board = np.zeros((3,3))
+    self.mask_p1 = 0 ## player's ('x') pieces
+    self.mask_p2 = 0 ## AI's ('o') pieces
+    ## set by the move that completes a line
+    self.winner = None
+    self.resetSearchCounters()
+
+  def resetSearchCounters(self):
+    self.num_nodes = 0
+    self.num_cutoffs = 0
+
+  def searchWithStats(self, sample_interval=0, sample_hook=None):
+    ## the AI's `max` search, returned together with the statistics it collected
+    stats = SearchStats(sample_interval, sample_hook)
+    self.stats = stats
+    stats.start()
+    try:
+      result = self.max(-math.inf, math.inf)
+    finally:
+      stats.stop()
+      self.stats = None
+    return result, stats
+
+  @property
+  def board(self):
+    ## numpy view of the bitboards: only used for display and compatibility
+    import numpy as np
+    board = np.zeros((3,3))
+    for cell_index in range(9):
+      if (self.mask_p1 >> cell_index) & 1:
+        board[cell_index // 3][cell_index % 3] = 1
+      elif (self.mask_p2 >> cell_index) & 1:
+        board[cell_index // 3][cell_index % 3] = -1
+    return board
+
+  @board.setter
+  def board(self, board):
+    self.mask_p1 = 0
+    self.mask_p2 = 0
+    for row_index in range(3):
+      for col_index in range(3):
+        if board[row_index][col_index] > 0:
+          self.mask_p1 |= 1 << (3*row_index + col_index)
+        elif board[row_index][col_index] < 0:
+          self.mask_p2 |= 1 << (3*row_index + col_index)
+    self.updateWinner()
+
+  def updateWinner(self):
+    ## recompute the winner from every line, after the masks were set directly
+    self.winner = None
+    if LIST_IS_WIN[self.mask_p1]:
+      self.winner = 1
+    elif LIST_IS_WIN[self.mask_p2]:
+      self.winner = -1
+
+  def makeMove(self, cell_index, player_sgn):
+    ## place a piece: no line was complete before it, so any complete line goes through it
+    if player_sgn > 0:
+      self.mask_p1 |= 1 << cell_index
+      mask = self.mask_p1
+    else:
+      self.mask_p2 |= 1 << cell_index
+      mask = self.mask_p2
+    if LIST_IS_WIN[mask]:
+      self.winner = player_sgn
+
+  def unmakeMove(self, cell_index, player_sgn):
+    ## undo `makeMove`: no move is made once a line is complete, so the game was not won before it
+    if player_sgn > 0:
+      self.mask_p1 &= ~(1 << cell_index)
+    else: self.mask_p2 &= ~(1 << cell_index)
+    self.winner = None
 
   def play(self):
     print("You are 'x', and your oponent (an AI) is 'o'.")
@@ -44,7 +197,7 @@ class TicTacToe():
           x = int(input("Column (x): "))
           y = int(input("   Row (y): "))
           if self.isValidMove((x, y)):
-            self.board[y][x] = 1
+            self.makeMove(3*y + x, 1)
             print(" ")
             break
           else:
@@ -52,79 +205,95 @@ class TicTacToe():
             print(" ")
       ## AI's turn
       else:
-        ## choose best move based on minimax algorithm
+        ## choose best move: look it up in the book, otherwise use the minimax algorithm
         t_start = time.time()
-        _, (x, y) = self.max(-np.inf, np.inf)
+        result = self.lookupBook()
+        if (result is None) and BOOL_PARALLEL:
+          result = self.searchParallel()
+        if result is None:
+          result = self.max(-math.inf, math.inf)
+        _, (x, y) = result
         t_end = time.time()
         t_elapse = round(t_end - t_start, 7)
-        self.board[x][y] = -1
+        self.makeMove(3*x + y, -1)
         print(f"Evaluation time: {t_elapse} seconds.")
         print(f"The AI's move is: ({y}, {x})")
         print(" ")
       ## increment depth
       self.depth += 1
 
-  def max(self, alpha, beta):
-    ## check if the game has concluded
-    status = self.checkGameOverStatus()
-    if status is not None:
-      return -1*status, (None, None)
-    ## initialise to worst case
-    max_score = -np.inf
-    max_x = None
-    max_y = None
-    ## loop over possible moves
-    for row_index in range(3):
-      for col_index in range(3):
-        ## free spot on the board
-        if self.board[row_index][col_index] == 0:
-          ## make temporary (AI) move
-          self.board[row_index][col_index] = -1
-          ## determine the best move that the oponent (player) can play
-          score, _ = self.min(alpha, beta)
-          if (score > max_score):
-            max_score = score
-            max_x, max_y = row_index, col_index
-          ## reset: remove temporary piece
-          self.board[row_index][col_index] = 0
-          ## alpha-beta stuff
-          if BOOL_ALPHA_BETA:
-            if max_score >= beta:
-              return max_score, (max_x, max_y)
-            if max_score > alpha:
-              alpha = max_score
-    return max_score, (max_x, max_y)
-
-  def min(self, alpha, beta):
-    ## check if the game has concluded
-    status = self.checkGameOverStatus()
-    if status is not None:
-      return -1*status, (None, None)
-    ## initialise to worst case
-    min_score = np.inf
-    min_x = None
-    min_y = None
-    ## loop over possible moves
-    for row_index in range(3):
-      for col_index in range(3):
-        ## free spot on the board
-        if self.board[row_index][col_index] == 0:
-          ## make temporary opponent (player) move
-          self.board[row_index][col_index] = 1
-          ## determine the best move that the (player) can play
-          score, _ = self.max(alpha, beta)
-          if (score < min_score):
-            min_score = score
-            min_x, min_y = row_index, col_index
-          ## reset: remove temporary piece
-          self.board[row_index][col_index] = 0
-          ## alpha-beta stuff
-          if BOOL_ALPHA_BETA:
-            if min_score <= alpha:
-              return min_score, (min_x, min_y)
-            if min_score < beta:
-              beta = min_score
-    return min_score, (min_x, min_y)
+  def max(self, alpha, beta, depth=0):
+    ## the AI's best score and move (row, col), searched by `negamax`
+    score, cell_index = negamax(self, -1, alpha, beta, depth)
+    if cell_index is None:
+      return score, (None, None)
+    return score, (cell_index // 3, cell_index % 3)
+
+  def min(self, alpha, beta, depth=0):
+    ## the player's best move (row, col), and its score for the AI
+    value, cell_index = negamax(self, 1, -beta, -alpha, depth)
+    if cell_index is None:
+      return -value, (None, None)
+    return -value, (cell_index // 3, cell_index % 3)
+
+  ## rules interface of `tictactoe_negamax`: moves are cell indices, and the search
+  ## always reaches the end of the game
+  def checkSearchLimits(self, depth):
+    return None
+
+  def getSearchMoves(self, player_sgn, depth, first_move):
+    return LIST_MASK_CELLS[FULL_MASK & ~(self.mask_p1 | self.mask_p2)]
+
+  def makeSearchMove(self, cell_index, player_sgn):
+    self.makeMove(cell_index, player_sgn)
+
+  def unmakeSearchMove(self, cell_index, player_sgn, undo):
+    self.unmakeMove(cell_index, player_sgn)
+
+  def probeSearchTable(self, player_sgn, depth, alpha, beta):
+    ## only root positions are looked up, in the cache of earlier sessions. it holds
+    ## exact values (for the side to move), as every search reaches the end of the game,
+    ## and one entry serves all 8 symmetric positions: moves are stored for the canonical one.
+    if (depth > 0) or (self.search_cache is None):
+      return None, None, None
+    mask_p1, mask_p2, sym_index = canonicalizeMasks(self.mask_p1, self.mask_p2)
+    key = 2*getBookIndex(mask_p1, mask_p2) + (player_sgn > 0)
+    cached = self.search_cache.get(key)
+    if cached is None:
+      return None, None, (key, sym_index)
+    value, _, _, cell_index = cached
+    return int(value), LIST_SYMMETRIES_INV[sym_index][cell_index], (key, sym_index)
+
+  def storeSearchTable(self, entry, player_sgn, depth, value, alpha, beta, cell_index):
+    ## values outside the root window are only bounds
+    if (entry is None) or (cell_index is None) or not (alpha < value < beta):
+      return
+    key, sym_index = entry
+    self.search_cache.put(key, value, 0, 0, LIST_SYMMETRIES[sym_index][cell_index])
+
+  def recordCutoff(self, cell_index, player_sgn, depth):
+    pass
+
+  def searchParallel(self, num_workers=NUM_WORKERS):
+    ## root-split version of `max` (see `tictactoe_negamax.searchRootSplit`)
+    list_cells = LIST_MASK_CELLS[FULL_MASK & ~(self.mask_p1 | self.mask_p2)]
+    if (self.checkGameOverStatus() is not None) or (num_workers < 2) or (len(list_cells) < 2):
+      return self.max(-math.inf, math.inf)
+    executor = getExecutor(self, num_workers, initialiseWorker)
+    score, cell_index = searchRootSplit(self, -1, list_cells, executor, searchWorkerRootMove, (self.mask_p1, self.mask_p2))
+    return score, (cell_index // 3, cell_index % 3)
+
+  def lookupBook(self):
+    ## perfect-play score and best move (row, col) for the side to move, or None
+    if self.book is None:
+      return None
+    entry = self.book[getBookIndex(self.mask_p1, self.mask_p2)]
+    if entry == BOOK_UNREACHABLE:
+      return None
+    score, cell_index = decodeBookEntry(entry)
+    if cell_index is None:
+      return score, (None, None)
+    return score, (cell_index // 3, cell_index % 3)
 
   def isValidMove(self, to_coord):
     x, y = to_coord
@@ -135,36 +304,15 @@ class TicTacToe():
     if (y < 0) or (2 < y):
       return False
     ## check that the target cell is empty
-    return self.board[y][x] == 0
+    return not ((self.mask_p1 | self.mask_p2) >> (3*y + x)) & 1
 
   def checkGameOverStatus(self):
-    ## check if a horizontal win occured
-    for row_index in range(3):
-      if (abs(self.board[row_index][0]) > 0) and (
-          (self.board[row_index][0] == self.board[row_index][1]) and
-          (self.board[row_index][0] == self.board[row_index][2])
-        ): return self.board[row_index][0]
-    ## check if a vertical win occured
-    for col_index in range(3):
-      if (abs(self.board[0][col_index]) > 0) and (
-          (self.board[0][col_index] == self.board[1][col_index]) and
-          (self.board[0][col_index] == self.board[2][col_index])
-        ): return self.board[0][col_index]
-    ## check if a top-left to bottom-right diagonal win occured
-    if (abs(self.board[0][0]) > 0) and (
-        (self.board[0][0] == self.board[1][1]) and
-        (self.board[0][0] == self.board[2][2])
-      ): return self.board[0][0]
-    ## check if a top-right to bottom-left diagonal win occured
-    if (abs(self.board[0][2]) > 0) and (
-        (self.board[0][2] == self.board[1][1]) and
-        (self.board[0][2] == self.board[2][0])
-      ): return self.board[0][2]
+    ## check if a row, column or diagonal win occured (tracked by `makeMove`)
+    if self.winner is not None:
+      return self.winner
     ## check if there are any free spots available on the board
-    for row in self.board:
-      for cell in row:
-        if cell == 0:
-          return None
+    if (self.mask_p1 | self.mask_p2) != FULL_MASK:
+      return None
     ## it is a tie
     return 0
 
@@ -180,7 +328,10 @@ class TicTacToe():
     print(" ")
 
   def tests(self):
+    ## the searches below must not read or write the search cache
+    search_cache, self.search_cache = self.search_cache, None
     ## test 1: detect free spots
+    import numpy as np
     self.board = np.array([
       [0, 0, 0],
       [0, 0, 0],
@@ -208,14 +359,16 @@ class TicTacToe():
         raise Exception(f"Failed test 3: {val}")
       ## test 4: row win
       for col_index in range(3):
-        self.board = np.zeros((3,3))
-        self.board[:, col_index] = val
+        board = np.zeros((3,3))
+        board[:, col_index] = val
+        self.board = board
         if not (self.checkGameOverStatus() == val):
           raise Exception(f"Failed test 4: {col_index} {val}")
       ## test 5: column win
       for row_index in range(3):
-        self.board = np.zeros((3,3))
-        self.board[row_index, :] = val
+        board = np.zeros((3,3))
+        board[row_index, :] = val
+        self.board = board
         if not (self.checkGameOverStatus() == val):
           raise Exception(f"Failed test 5: {row_index} {val}")
     ## test 6: draw
@@ -226,15 +379,104 @@ class TicTacToe():
     ])
     if not (self.checkGameOverStatus() == 0):
       raise Exception("Failed test 6: did not detect draw.")
+    ## test 7: batch evaluation agrees with the single board checks
+    list_boards = [np.zeros((3,3)), np.eye(3), -np.eye(3)[::-1], self.board]
+    list_status = []
+    for board in list_boards:
+      self.board = board
+      status = self.checkGameOverStatus()
+      list_status.append(STATUS_ONGOING if (status is None) else status)
+    if not np.array_equal(checkGameOverStatusBatch(np.array(list_boards, dtype=np.int8)), list_status):
+      raise Exception("Failed test 7: batch evaluation disagrees.")
+    ## test 8: the mask, cell and batch canonical forms agree on every reachable position
+    list_positions = []
+    list_stack = [(0, 0, 1)]
+    while len(list_stack) > 0:
+      mask_p1, mask_p2, player_sgn = list_stack.pop()
+      list_positions.append((mask_p1, mask_p2))
+      if LIST_IS_WIN[mask_p1] or LIST_IS_WIN[mask_p2]:
+        continue
+      for cell_index in LIST_MASK_CELLS[FULL_MASK & ~(mask_p1 | mask_p2)]:
+        if player_sgn > 0:
+          list_stack.append((mask_p1 | (1 << cell_index), mask_p2, -1))
+        else: list_stack.append((mask_p1, mask_p2 | (1 << cell_index), 1))
+    list_positions = sorted(set(list_positions))
+    list_boards = [
+      [((mask_p1 >> cell_index) & 1) - ((mask_p2 >> cell_index) & 1) for cell_index in range(9)]
+      for mask_p1, mask_p2 in list_positions
+    ]
+    array_batch, array_sym_indices = canonicalizeBatch(np.array(list_boards, dtype=np.int8))
+    for (mask_p1, mask_p2), list_board, batch_cells, batch_sym_index in zip(list_positions, list_boards, array_batch, array_sym_indices):
+      canon_p1, canon_p2, mask_sym_index = canonicalizeMasks(mask_p1, mask_p2)
+      mask_cells = tuple(((canon_p1 >> cell_index) & 1) - ((canon_p2 >> cell_index) & 1) for cell_index in range(9))
+      cells, cells_sym_index = canonicalizeCells(list_board)
+      if not (mask_cells == cells == tuple(batch_cells.tolist())) or not (mask_sym_index == cells_sym_index == batch_sym_index):
+        raise Exception(f"Failed test 8: canonical forms disagree for {list_board}.")
+    ## test 9: the search cache is opt-in. a result stored in a (temporary) cache answers
+    ## the rotated position with the rotated move, and nothing is written when it is off.
+    import tempfile
+    if BOOL_CACHE != (TicTacToe().search_cache is not None):
+      raise Exception("Failed test 9: the search cache does not follow BOOL_CACHE.")
+    with tempfile.TemporaryDirectory() as dir_path:
+      cache_path = os.path.join(dir_path, "cache.sqlite")
+      ## the AI has to block the top row
+      list_position = [(0, 1), (4, -1), (1, 1)]
+      self.initialise()
+      for cell_index, player_sgn in list_position:
+        self.makeMove(cell_index, player_sgn)
+      self.search_cache = SearchCache(cache_path, CACHE_VERSION)
+      _, (row_index, col_index) = self.max(-math.inf, math.inf)
+      self.search_cache.close()
+      ## a new cache object has nothing in memory, so the result comes from the file
+      self.search_cache = SearchCache(cache_path, CACHE_VERSION)
+      list_perm = LIST_SYMMETRIES[1]
+      self.initialise()
+      for cell_index, player_sgn in list_position:
+        self.makeMove(list_perm[cell_index], player_sgn)
+      _, (rotated_row, rotated_col) = self.max(-math.inf, math.inf)
+      if (self.num_nodes != 1) or (3*rotated_row + rotated_col != list_perm[3*row_index + col_index]):
+        raise Exception(f"Failed test 9: cached move {(rotated_row, rotated_col)} for {(row_index, col_index)} ({self.num_nodes} nodes).")
+      ## with the cache off, searching another position adds no entry
+      cache = self.search_cache
+      self.search_cache = None
+      self.initialise()
+      self.makeMove(4, 1)
+      self.max(-math.inf, math.inf)
+      num_entries = cache.connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+      cache.close()
+      if num_entries != 1:
+        raise Exception(f"Failed test 9: the cache holds {num_entries} entries.")
     ## success
+    self.search_cache = search_cache
     print("Passed all tests.")
 
 
+## ###########################
+## PARALLEL SEARCH WORKERS
+## ###########################
+worker_game = None
+
+def initialiseWorker():
+  global worker_game
+  worker_game = TicTacToe()
+
+def searchWorkerRootMove(mask_p1, mask_p2, player_sgn, cell_index, alpha):
+  ## worker entry point of `searchRootSplit`: value of one root move, and the nodes it took
+  worker_game.mask_p1 = mask_p1
+  worker_game.mask_p2 = mask_p2
+  worker_game.updateWinner()
+  worker_game.resetSearchCounters()
+  return searchRootMove(worker_game, player_sgn, cell_index, alpha), worker_game.num_nodes
+
+
 ## ###########################
 ## DEFINE MAIN PROGRAM
 ## ###########################
 def main():
+  os.system("clear")
   game = TicTacToe()
+  game.tests()
+  game.initialise()
   game.play()
 
 
@@ -0,0 +1,63 @@
+import sys
+import tictactoe_v1 as v1
+
+
+## ###########################
+## BOOK GENERATOR
+## ###########################
+def solvePosition(game, book, player_sgn):
+  ## plain minimax (no pruning) over every reachable position. moves are tried in the
+  ## same order as `TicTacToe.max`/`min`, and only a strictly better score replaces
+  ## the best move, so the book plays exactly the move the search would have chosen.
+  book_index = v1.getBookIndex(game.mask_p1, game.mask_p2)
+  if book[book_index] != v1.BOOK_UNREACHABLE:
+    score, _ = v1.decodeBookEntry(book[book_index])
+    return score
+  best_score = None
+  best_cell_index = None
+  status = game.checkGameOverStatus()
+  if status is not None:
+    best_score = -1*status
+  else:
+    mask_free = v1.FULL_MASK & ~(game.mask_p1 | game.mask_p2)
+    for cell_index in range(9):
+      if (mask_free >> cell_index) & 1:
+        game.makeMove(cell_index, player_sgn)
+        score = solvePosition(game, book, -player_sgn)
+        game.unmakeMove(cell_index, player_sgn)
+        ## the AI (-1) maximises the score, and the player (+1) minimises it
+        if (best_score is None) or (-player_sgn * (score - best_score) > 0):
+          best_score = score
+          best_cell_index = cell_index
+  book[book_index] = v1.encodeBookEntry(best_score, best_cell_index)
+  return best_score
+
+def createBook(file_path=v1.BOOK_PATH):
+  game = v1.TicTacToe()
+  game.initialise()
+  book = bytearray([v1.BOOK_UNREACHABLE] * v1.BOOK_NUM_POSITIONS)
+  ## the player ('x') always moves first
+  solvePosition(game, book, 1)
+  with open(file_path, "wb") as book_file:
+    book_file.write(book)
+  num_positions = sum(1 for entry in book if entry != v1.BOOK_UNREACHABLE)
+  print(f"Solved {num_positions} positions. Saved book: {file_path}")
+
+
+## ###########################
+## DEFINE MAIN PROGRAM
+## ###########################
+def main():
+  if len(sys.argv) > 1:
+    createBook(sys.argv[1])
+  else: createBook()
+
+
+## ###########################
+## RUN MAIN
+## ###########################
+if __name__ == "__main__":
+  main()
+
+
+## END OF PROGRAM
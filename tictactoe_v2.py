@@ -1,7 +1,17 @@
-import os, sys
-import numpy as np
-sys.setrecursionlimit(1500)
-os.system("clear")
+## importing this module has no side effects: numpy and concurrent.futures are only
+## imported by the functions that use them
+import os, math, random, time
+from tictactoe_stats import SearchStats
+from tictactoe_trace import TraceLog
+from tictactoe_negamax import (
+  negamax, negamaxStack, searchAspiration, SearchBudget, getExecutor, searchRootMove, searchRootSplit
+)
+from tictactoe_cache import SearchCache
+## cell (x, y) is stored in bit (3*y + x) of a 9-bit mask
+from tictactoe_tables import (
+  FULL_MASK, LIST_WIN_MASKS, LIST_LINE_INDICES, LIST_MASK_CELLS, LIST_IS_WIN,
+  LIST_SYMMETRIES, LIST_SYMMETRIES_INV, canonicalizeCells
+)
 
 
 ## ###################
@@ -13,44 +23,784 @@ def debug():
 
 def getIndexClosestValue(list_vals, target_val):
   ## work with arrays
+  import numpy as np
   array_vals = np.asarray(list_vals)
   return np.argmin(np.abs(array_vals - target_val))
 
-def createLogFile():
-  with open("log.txt", "w") as txt_file:
-    txt_file.write(f"Tic Tac Toe v2.0\n")
-    txt_file.write(f"\n")
+def createTraceLog(file_path):
+  trace = TraceLog(file_path, TRACE_MAX_BYTES, TRACE_NUM_BACKUPS)
+  trace.record(formatTraceText, "Tic Tac Toe v2.0\n")
+  return trace
 
-def appendToLogFile(str):
-  with open("log.txt", "a") as txt_file:
-    txt_file.write(f"{str}\n")
+
+## ###################
+## TRACE RECORDS
+## ###################
+## the search only stores the arguments of these functions: the trace log's writer
+## thread turns them into text
+def formatTraceText(text):
+  return text
+
+def formatTraceMove(player_sgn, cell_index, piece_index, captured_index):
+  p_old = 0 if (captured_index is None) else -player_sgn * (captured_index + 1)
+  p_new = player_sgn * (piece_index + 1)
+  return f"{'P1' if (player_sgn > 0) else 'AI'}: ({cell_index % 3}, {cell_index // 3}), p_old = {p_old}, p_new = {p_new}"
+
+def formatTraceBoard(tuple_masks_p1, tuple_masks_p2, pieces_p1, pieces_p2):
+  list_cells = [0] * 9
+  for piece_index, (mask_p1, mask_p2) in enumerate(zip(tuple_masks_p1, tuple_masks_p2)):
+    for cell_index in range(9):
+      if (mask_p1 >> cell_index) & 1: list_cells[cell_index] = piece_index + 1
+      if (mask_p2 >> cell_index) & 1: list_cells[cell_index] = -(piece_index + 1)
+  list_lines = [
+    " ".join([f"{cell_value:2d}" for cell_value in list_cells[3*y_index : 3*y_index + 3]])
+    for y_index in range(3)
+  ]
+  list_lines.append("Player 1's pieces: " + " ".join([
+    f"x{piece_index + 1}" for piece_index in range(len(tuple_masks_p1)) if (pieces_p1 >> piece_index) & 1
+  ]))
+  list_lines.append("Player 2's pieces: " + " ".join([
+    f"o{piece_index + 1}" for piece_index in range(len(tuple_masks_p2)) if (pieces_p2 >> piece_index) & 1
+  ]))
+  return "\n".join(list_lines)
+
+def formatTraceEnd(player_sgn, status):
+  return f"{'P1' if (player_sgn > 0) else 'AI'}: End of search. Game status: {status}\n"
 
 
 ## ###########################
 ## PROGRAM PARAMETERS
 ## ###########################
 BOOL_DEBUG    = 0
+BOOL_TRANSPOSITION = 1
+BOOL_SOLVED   = 1
+BOOL_CACHE    = 0 ## opt in to keep root search results on disk between sessions
+BOOL_ITERATIVE_DEEPENING = 1
+BOOL_MOVE_ORDERING = 1
+BOOL_PVS      = 1 ## principal variation search (see `tictactoe_negamax`)
+BOOL_ASPIRATION = 1 ## iterative deepening searches in a window around the previous iteration's score
+ASPIRATION_WINDOW = 0.05 ## initial half-width of that window
+BOOL_PARALLEL = 0
+BOOL_BOUNDED  = 0 ## the AI's iterative deepening search stops at a node and memory budget
 MAX_DEPTH     = 5
+TIME_BUDGET   = 1.0 ## wall-clock seconds per AI move when deepening iteratively
+MAX_NODES     = 1 << 20 ## node budget of a bounded search
+MAX_MEMORY    = 512 << 20 ## bytes resident in the process, beyond which a bounded search stops
+NUM_WORKERS   = os.cpu_count() or 1 ## processes used by the parallel (root-split) search
+TT_NUM_ENTRIES = 1 << 18 ## size cap of the transposition table (rounded down to a power of two)
+SOLVED_PATH   = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tictactoe_v2_solved.npy")
+CACHE_PATH    = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tictactoe_v2_cache.sqlite")
+CACHE_VERSION = 1 ## increase when the search or evaluation changes, to drop older cached results
+TRACE_PATH    = "log.txt" ## search trace written when debugging
+TRACE_MAX_BYTES = 64 << 20 ## the trace is rotated once it reaches this size...
+TRACE_NUM_BACKUPS = 3 ## ...keeping this many older trace files
 SYMBOL_PLAYER = "+"
 SYMBOL_AI     = "-"
 
 
+## ###################
+## MOVE TABLES
+## ###################
+## move ordering priorities: each tier is searched before the next, and moves within
+## a tier are ordered by their history score
+PRIORITY_TIER     = 1 << 40
+PRIORITY_FIRST    = 4 * PRIORITY_TIER ## hash move (or previous iteration's best root move)
+PRIORITY_WIN      = 3 * PRIORITY_TIER ## completes a line
+PRIORITY_TACTICAL = 2 * PRIORITY_TIER ## blocks an opponent's line or gobbles an opponent piece
+PRIORITY_KILLER   = 1 * PRIORITY_TIER ## caused a cutoff in a sibling position
+## legal-move tables: a move set has bit (5*cell_index + piece_index) set for each legal
+## move. LIST_CELL_SPREAD spreads a 9-bit cell mask to the piece-0 bits of a move set,
+## and LIST_CELL_MOVES[cell_index][pieces] holds the (cell_index, piece_index) moves of
+## a cell's 5 bits, smallest piece first
+LIST_CELL_SPREAD = [0] * (FULL_MASK + 1)
+for mask in range(1, FULL_MASK + 1):
+  LIST_CELL_SPREAD[mask] = LIST_CELL_SPREAD[mask & (mask - 1)] | (1 << 5*((mask & -mask).bit_length() - 1))
+LIST_CELL_MOVES = [
+  [tuple((cell_index, piece_index) for piece_index in range(5) if (pieces >> piece_index) & 1) for pieces in range(1 << 5)]
+  for cell_index in range(9)
+]
+
+
+## ###################
+## BATCH EVALUATION
+## ###################
+## batch status of a board where the game has not concluded (`None` for a single board)
+STATUS_ONGOING = 2
+
+def checkGameOverStatusBatch(array_boards, array_pieces_left=None):
+  ## status of N boards at once, given as an (N,3,3) or (N,9) array of signed piece
+  ## sizes: 1 if the player won, -1 if the AI won, 0 if it is a tie, and STATUS_ONGOING
+  ## otherwise. a cell belongs to the owner of its top piece (its sign), and a game
+  ## without a winner is only tied once neither player has pieces left, i.e. where
+  ## `array_pieces_left` (e.g. pieces_p1 | pieces_p2) is zero.
+  import numpy as np
+  array_cells = np.sign(np.asarray(array_boards).reshape(-1, 9)).astype(np.int8)
+  array_line_sums = array_cells[:, LIST_LINE_INDICES].sum(axis=2)
+  if array_pieces_left is None:
+    array_status = np.full(len(array_cells), STATUS_ONGOING, dtype=np.int8)
+  else: array_status = np.where(np.asarray(array_pieces_left) == 0, 0, STATUS_ONGOING).astype(np.int8)
+  array_status[np.any(array_line_sums == -3, axis=1)] = -1
+  array_status[np.any(array_line_sums == 3, axis=1)] = 1
+  return array_status
+
+
+## ###################
+## STATIC EVALUATION
+## ###################
+## score (for the AI) of a position where a depth-limited search stops: the weighted
+## difference of the features below, squashed to lie strictly between a loss (-1) and
+## a win (1). a player can still complete a line if each of its cells is their own, free,
+## or holds an opponent piece smaller than the largest piece they have left; such a
+## line is worth EVAL_LINE_WEIGHTS[number of own pieces in it]. top pieces the opponent
+## can no longer gobble are safe, the others are capturable, and every unit of piece
+## size still in hand adds to the inventory.
+EVAL_LINE_WEIGHTS = [0, 1, 4, 0]
+EVAL_SAFE_WEIGHT  = 2
+EVAL_CAPTURABLE_WEIGHT = 1
+EVAL_INVENTORY_WEIGHT  = 1
+EVAL_SCALE = 16
+## size of the largest piece and total size of the pieces in a pieces-left mask
+LIST_LARGEST_SIZE = [pieces.bit_length() for pieces in range(1 << 5)]
+LIST_INVENTORY = [
+  sum((piece_index + 1) for piece_index in range(5) if (pieces >> piece_index) & 1)
+  for pieces in range(1 << 5)
+]
+LIST_POPCOUNT = [bin(mask).count("1") for mask in range(FULL_MASK + 1)]
+
+def squashEvaluation(raw_score):
+  return raw_score / (abs(raw_score) + EVAL_SCALE)
+
+def evaluateBatch(array_boards, array_pieces_p1, array_pieces_p2):
+  ## `TicTacToe.evaluate` of N positions at once: boards as in `checkGameOverStatusBatch`,
+  ## and each player's pieces-left masks
+  import numpy as np
+  array_cells = np.asarray(array_boards).reshape(-1, 9).astype(np.int64)
+  array_sizes = np.abs(array_cells)
+  array_largest_p1 = np.array(LIST_LARGEST_SIZE)[np.asarray(array_pieces_p1)][:, None]
+  array_largest_p2 = np.array(LIST_LARGEST_SIZE)[np.asarray(array_pieces_p2)][:, None]
+  bool_own_p1 = array_cells > 0
+  bool_own_p2 = array_cells < 0
+  bool_free = array_cells == 0
+  bool_capturable_p1 = bool_own_p1 & (array_sizes < array_largest_p2)
+  bool_capturable_p2 = bool_own_p2 & (array_sizes < array_largest_p1)
+  array_line_weights = np.array(EVAL_LINE_WEIGHTS)
+  array_raw = np.zeros(len(array_cells), dtype=np.int64)
+  for player_sgn, bool_own, bool_capturable, bool_reachable in [
+      (-1, bool_own_p2, bool_capturable_p2, bool_free | bool_capturable_p1),
+      ( 1, bool_own_p1, bool_capturable_p1, bool_free | bool_capturable_p2)
+    ]:
+    bool_open = np.all((bool_own | bool_reachable)[:, LIST_LINE_INDICES], axis=2)
+    array_counts = bool_own[:, LIST_LINE_INDICES].sum(axis=2)
+    array_score = (bool_open * array_line_weights[array_counts]).sum(axis=1)
+    array_score += EVAL_SAFE_WEIGHT * (bool_own & ~bool_capturable).sum(axis=1)
+    array_score += EVAL_CAPTURABLE_WEIGHT * bool_capturable.sum(axis=1)
+    array_raw -= player_sgn * array_score
+  array_raw += EVAL_INVENTORY_WEIGHT * (
+    np.array(LIST_INVENTORY)[np.asarray(array_pieces_p2)] - np.array(LIST_INVENTORY)[np.asarray(array_pieces_p1)]
+  )
+  return squashEvaluation(array_raw)
+
+
+## ###################
+## ZOBRIST HASHING
+## ###################
+## the board hash keeps one 64-bit lane per symmetry (packed into a single int),
+## so the hashes of all 8 symmetric boards are updated with a single xor
+HASH_BITS  = 64
+HASH_MASK  = (1 << HASH_BITS) - 1
+LIST_HASH_SHIFTS = [HASH_BITS * sym_index for sym_index in range(len(LIST_SYMMETRIES))]
+BOUND_EXACT = 0
+BOUND_LOWER = 1
+BOUND_UPPER = 2
+
+def createZobristTables(seed=2022):
+  rng = random.Random(seed)
+  ## hash of every (cell, piece size) for each player
+  list_cell_hashes_p1 = [[rng.getrandbits(HASH_BITS) for _ in range(5)] for _ in range(9)]
+  list_cell_hashes_p2 = [[rng.getrandbits(HASH_BITS) for _ in range(5)] for _ in range(9)]
+  def packLanes(list_cell_hashes, cell_index, piece_index):
+    return sum(
+      list_cell_hashes[list_perm[cell_index]][piece_index] << shift
+      for list_perm, shift in zip(LIST_SYMMETRIES, LIST_HASH_SHIFTS)
+    )
+  zobrist_p1 = [[packLanes(list_cell_hashes_p1, cell_index, piece_index) for piece_index in range(5)] for cell_index in range(9)]
+  zobrist_p2 = [[packLanes(list_cell_hashes_p2, cell_index, piece_index) for piece_index in range(5)] for cell_index in range(9)]
+  ## hash of every set of remaining pieces, and of the AI being the side to move
+  zobrist_pieces_p1 = [rng.getrandbits(HASH_BITS) for _ in range(1 << 5)]
+  zobrist_pieces_p2 = [rng.getrandbits(HASH_BITS) for _ in range(1 << 5)]
+  zobrist_ai_to_move = rng.getrandbits(HASH_BITS)
+  return zobrist_p1, zobrist_p2, zobrist_pieces_p1, zobrist_pieces_p2, zobrist_ai_to_move
+
+ZOBRIST_P1, ZOBRIST_P2, ZOBRIST_PIECES_P1, ZOBRIST_PIECES_P2, ZOBRIST_AI_TO_MOVE = createZobristTables()
+
+def getCanonicalKey(hash_board, pieces_p1, pieces_p2, player_sgn):
+  ## canonical key: the smallest board hash over all 8 symmetries (combined with
+  ## the remaining pieces and side to move), and the symmetry that produced it
+  list_hashes = [(hash_board >> shift) & HASH_MASK for shift in LIST_HASH_SHIFTS]
+  hash_min = min(list_hashes)
+  key = hash_min ^ ZOBRIST_PIECES_P1[pieces_p1] ^ ZOBRIST_PIECES_P2[pieces_p2]
+  if player_sgn < 0:
+    key ^= ZOBRIST_AI_TO_MOVE
+  return key, list_hashes.index(hash_min)
+
+
+## ###################
+## GAME STATE
+## ###################
+## a position packed into one int: cell c holds a 4-bit digit at bit 4*c (0: free, 1-5:
+## player piece of that size, 6-10: AI piece of size digit-5), followed by the player's
+## remaining pieces (bits 36-40) and the AI's (bits 41-45). the player moves first, so
+## it is the side to move whenever both sides have as many pieces left.
+STATE_DIGIT_BITS = 4
+STATE_DIGIT_MASK = (1 << STATE_DIGIT_BITS) - 1
+STATE_PIECES_SHIFT_P1 = 9 * STATE_DIGIT_BITS
+STATE_PIECES_SHIFT_P2 = STATE_PIECES_SHIFT_P1 + 5
+
+class GameState():
+  ## immutable, hashable position: cheap to store, share with workers and use as a key
+  __slots__ = ("packed",)
+
+  def __init__(self, packed=(0b11111 << STATE_PIECES_SHIFT_P1) | (0b11111 << STATE_PIECES_SHIFT_P2)):
+    object.__setattr__(self, "packed", packed)
+
+  def __setattr__(self, name, value):
+    raise AttributeError("GameState is immutable.")
+
+  def __reduce__(self):
+    return (GameState, (self.packed,))
+
+  def __eq__(self, other):
+    return isinstance(other, GameState) and (self.packed == other.packed)
+
+  def __hash__(self):
+    return hash(self.packed)
+
+  def __repr__(self):
+    return f"GameState({self.packed:#x})"
+
+  @property
+  def pieces_p1(self):
+    return (self.packed >> STATE_PIECES_SHIFT_P1) & 0b11111
+
+  @property
+  def pieces_p2(self):
+    return (self.packed >> STATE_PIECES_SHIFT_P2) & 0b11111
+
+  @property
+  def player_sgn(self):
+    ## side to move
+    return 1 if (bin(self.pieces_p1).count("1") == bin(self.pieces_p2).count("1")) else -1
+
+  @property
+  def winner(self):
+    ## 1 / -1 if the player's / AI's top pieces complete a line, otherwise None
+    mask_p1 = 0
+    mask_p2 = 0
+    for cell_index in range(9):
+      digit = self.getCellDigit(cell_index)
+      if 1 <= digit <= 5:
+        mask_p1 |= 1 << cell_index
+      elif digit > 5:
+        mask_p2 |= 1 << cell_index
+    if LIST_IS_WIN[mask_p1]:
+      return 1
+    if LIST_IS_WIN[mask_p2]:
+      return -1
+    return None
+
+  def getCellDigit(self, cell_index):
+    return (self.packed >> (STATE_DIGIT_BITS * cell_index)) & STATE_DIGIT_MASK
+
+  def apply(self, move):
+    ## position after the side to move plays (cell_index, piece_index): the piece may only
+    ## cover (gobble) a smaller opponent piece. an illegal move raises a ValueError.
+    cell_index, piece_index = move
+    if (self.winner is not None) or ((self.pieces_p1 | self.pieces_p2) == 0):
+      raise ValueError("The game has concluded.")
+    digit_shift = STATE_DIGIT_BITS * cell_index
+    if self.player_sgn > 0:
+      digit = piece_index + 1
+      pieces_bit = 1 << (STATE_PIECES_SHIFT_P1 + piece_index)
+      bool_covers = 5 < self.getCellDigit(cell_index) < 5 + digit
+    else:
+      digit = 5 + piece_index + 1
+      pieces_bit = 1 << (STATE_PIECES_SHIFT_P2 + piece_index)
+      bool_covers = 0 < self.getCellDigit(cell_index) < digit - 5
+    if not (self.packed & pieces_bit):
+      raise ValueError(f"Piece {piece_index} has already been played.")
+    if (self.getCellDigit(cell_index) != 0) and not bool_covers:
+      raise ValueError(f"Cell {cell_index} is occupied.")
+    packed = (self.packed & ~(STATE_DIGIT_MASK << digit_shift) & ~pieces_bit) | (digit << digit_shift)
+    return GameState(packed)
+
+  def key(self):
+    ## the position's key in the transposition and solved tables (see `getCanonicalKey`)
+    hash_board = 0
+    for cell_index in range(9):
+      digit = self.getCellDigit(cell_index)
+      if 1 <= digit <= 5:
+        hash_board ^= ZOBRIST_P1[cell_index][digit - 1]
+      elif digit > 5:
+        hash_board ^= ZOBRIST_P2[cell_index][digit - 6]
+    key, _ = getCanonicalKey(hash_board, self.pieces_p1, self.pieces_p2, self.player_sgn)
+    return key
+
+
+## ###################
+## TRANSPOSITION TABLE
+## ###################
+class TranspositionTable():
+  def __init__(self, num_entries=TT_NUM_ENTRIES):
+    ## fixed number of slots, so memory stays bounded however long the session
+    self.num_entries = 1 << (max(int(num_entries), 1).bit_length() - 1)
+    self.index_mask = self.num_entries - 1
+    self.clear()
+
+  def clear(self):
+    self.list_entries = [None] * self.num_entries
+    self.generation = 0
+
+  def newSearch(self):
+    ## entries left over from older searches are the first to be replaced
+    self.generation += 1
+
+  def probe(self, key):
+    ## entry: (key, score, bound, draft, move, generation)
+    entry = self.list_entries[key & self.index_mask]
+    if (entry is not None) and (entry[0] == key):
+      return entry
+    return None
+
+  def store(self, key, score, bound, draft, move):
+    slot_index = key & self.index_mask
+    entry = self.list_entries[slot_index]
+    ## replacement policy: fill empty slots and refresh the same position, otherwise
+    ## keep the deeper search result unless it was stored by an older search
+    if ((entry is None) or (entry[0] == key) or
+        (entry[5] != self.generation) or (entry[3] <= draft)):
+      self.list_entries[slot_index] = (key, score, bound, draft, move, self.generation)
+
+
+## ###################
+## SOLVED-GAME TABLE
+## ###################
+## sorted uint64 entries: the canonical position key (`TicTacToe.getPositionKey`) with
+## its two lowest bits replaced by the perfect-play score (for the AI) plus one
+SOLVED_VALUE_MASK = 0b11
+
+def packSolvedEntries(array_keys, array_values):
+  import numpy as np
+  return (array_keys & ~np.uint64(SOLVED_VALUE_MASK)) | (array_values + 1).astype(np.uint64)
+
+def loadSolvedTable(file_path=SOLVED_PATH):
+  ## memory-map the table written by `tictactoe_v2_solver.py` (None if it has not been generated)
+  import numpy as np
+  if not os.path.isfile(file_path):
+    return None
+  return np.load(file_path, mmap_mode="r")
+
+def lookupSolvedValue(array_table, key):
+  import numpy as np
+  key &= ~SOLVED_VALUE_MASK
+  table_index = int(np.searchsorted(array_table, np.uint64(key)))
+  if table_index < len(array_table):
+    entry = int(array_table[table_index])
+    if (entry & ~SOLVED_VALUE_MASK) == key:
+      return (entry & SOLVED_VALUE_MASK) - 1
+  return None
+
+
 ## ###################
 ## GAME CLASS
 ## ###################
+class SearchTimeout(Exception):
+  pass
+
 class TicTacToe():
-  def __init__(self):
+  bool_alpha_beta    = True
+  bool_pvs           = BOOL_PVS
+  bool_transposition = BOOL_TRANSPOSITION
+
+  def __init__(self, trace_path=TRACE_PATH):
+    ## search settings: depth limit, iterative deepening deadline and first root move
+    self.max_depth = MAX_DEPTH
+    self.time_deadline = None
+    self.root_move = None
+    self.executor = None
+    self.transposition_table = TranspositionTable()
+    ## root search results of earlier sessions (None: not used)
+    self.search_cache = SearchCache(CACHE_PATH, CACHE_VERSION) if BOOL_CACHE else None
+    ## the solved table is memory-mapped on first use (see `solved_table`)
+    self.bool_solved_loaded = False
+    self.array_solved = None
+    ## detailed search statistics: only collected while `searchWithStats` runs
+    self.stats = None
+    self.trace = createTraceLog(trace_path) if BOOL_DEBUG else None
     self.initialise()
-    if BOOL_DEBUG:
-      createLogFile()
-      self.tests()
 
   def initialise(self):
-    self.board = np.zeros((3,3))
     self.list_piece_sizes_p1 = [ 1,  2,  3,  4,  5]
     self.list_piece_sizes_p2 = [-1, -2, -3, -4, -5]
-    self.list_piece_flags_p1 = [1] * len(self.list_piece_sizes_p1)
-    self.list_piece_flags_p2 = [1] * len(self.list_piece_sizes_p2)
+    ## occupancy mask of every piece size (indexed like the piece sizes)
+    self.list_masks_p1 = [0] * len(self.list_piece_sizes_p1)
+    self.list_masks_p2 = [0] * len(self.list_piece_sizes_p2)
+    ## union of each player's occupancy masks
+    self.mask_p1 = 0
+    self.mask_p2 = 0
+    ## bit `piece_index` is set while that piece has not been played
+    self.pieces_p1 = (1 << len(self.list_piece_sizes_p1)) - 1
+    self.pieces_p2 = (1 << len(self.list_piece_sizes_p2)) - 1
+    ## set by the move that completes a line
+    self.winner = None
+    ## zobrist hash of the board under all 8 symmetries
+    self.hash_board = 0
+    ## move ordering heuristics: two killer moves per depth, and a history score per
+    ## (cell, piece) for each player
+    num_plies = len(self.list_piece_sizes_p1) + len(self.list_piece_sizes_p2)
+    self.list_killers = [[None, None] for _ in range(num_plies + 1)]
+    self.list_history_p1 = [0] * (9 * len(self.list_piece_sizes_p1))
+    self.list_history_p2 = [0] * (9 * len(self.list_piece_sizes_p2))
+    self.resetSearchCounters()
+
+  def resetSearchCounters(self):
+    self.num_nodes = 0
+    self.num_cutoffs = 0
+
+  def searchWithStats(self, sample_interval=0, sample_hook=None, *, player_sgn=-1):
+    ## the `max` (AI) or `min` (player) search, returned together with the statistics it
+    ## collected. the positional arguments are those of `tictactoe_v1.TicTacToe.searchWithStats`.
+    stats = SearchStats(sample_interval, sample_hook)
+    self.stats = stats
+    stats.start()
+    try:
+      if player_sgn < 0:
+        result = self.max(-math.inf, math.inf, 0)
+      else: result = self.min(-math.inf, math.inf, 0)
+    finally:
+      stats.stop()
+      self.stats = None
+    return result, stats
+
+  def getCutoffRate(self):
+    ## fraction of searched nodes that were cut off by alpha-beta
+    if self.num_nodes == 0:
+      return 0.0
+    return self.num_cutoffs / self.num_nodes
+
+  @property
+  def board(self):
+    ## numpy view of the bitboards: only used for display and compatibility
+    import numpy as np
+    board = np.zeros((3,3))
+    for cell_index in range(9):
+      board[cell_index // 3][cell_index % 3] = self.getCellValue(cell_index)
+    return board
+
+  @board.setter
+  def board(self, board):
+    self.list_masks_p1 = [0] * len(self.list_piece_sizes_p1)
+    self.list_masks_p2 = [0] * len(self.list_piece_sizes_p2)
+    for y_index in range(3):
+      for x_index in range(3):
+        piece_size = int(board[y_index][x_index])
+        if piece_size > 0:
+          self.list_masks_p1[piece_size-1] |= 1 << (3*y_index + x_index)
+        elif piece_size < 0:
+          self.list_masks_p2[-piece_size-1] |= 1 << (3*y_index + x_index)
+    self.updateFromMasks()
+
+  def updateFromMasks(self):
+    ## recompute the union masks, hash and winner after the piece masks were set directly
+    self.mask_p1 = 0
+    self.mask_p2 = 0
+    for mask in self.list_masks_p1:
+      self.mask_p1 |= mask
+    for mask in self.list_masks_p2:
+      self.mask_p2 |= mask
+    self.hash_board = 0
+    for cell_index in range(9):
+      for piece_index in range(len(self.list_piece_sizes_p1)):
+        if (self.list_masks_p1[piece_index] >> cell_index) & 1:
+          self.hash_board ^= ZOBRIST_P1[cell_index][piece_index]
+        if (self.list_masks_p2[piece_index] >> cell_index) & 1:
+          self.hash_board ^= ZOBRIST_P2[cell_index][piece_index]
+    self.updateWinner()
+
+  def updateWinner(self):
+    ## recompute the winner from every line, after the masks were set directly
+    self.winner = None
+    if LIST_IS_WIN[self.mask_p1]:
+      self.winner = 1
+    elif LIST_IS_WIN[self.mask_p2]:
+      self.winner = -1
+
+  @property
+  def list_piece_flags_p1(self):
+    return [(self.pieces_p1 >> piece_index) & 1 for piece_index in range(len(self.list_piece_sizes_p1))]
+
+  @list_piece_flags_p1.setter
+  def list_piece_flags_p1(self, list_flags):
+    self.pieces_p1 = sum((1 << piece_index) for piece_index, flag in enumerate(list_flags) if flag)
+
+  @property
+  def list_piece_flags_p2(self):
+    return [(self.pieces_p2 >> piece_index) & 1 for piece_index in range(len(self.list_piece_sizes_p2))]
+
+  @list_piece_flags_p2.setter
+  def list_piece_flags_p2(self, list_flags):
+    self.pieces_p2 = sum((1 << piece_index) for piece_index, flag in enumerate(list_flags) if flag)
+
+  @property
+  def solved_table(self):
+    if not self.bool_solved_loaded:
+      self.solved_table = loadSolvedTable() if BOOL_SOLVED else None
+    return self.array_solved
+
+  @solved_table.setter
+  def solved_table(self, array_solved):
+    ## None disables the solved-game lookups
+    self.array_solved = array_solved
+    self.bool_solved_loaded = True
+
+  def copyState(self):
+    ## the position as a `GameState`
+    packed = (self.pieces_p1 << STATE_PIECES_SHIFT_P1) | (self.pieces_p2 << STATE_PIECES_SHIFT_P2)
+    for piece_index in range(len(self.list_piece_sizes_p1)):
+      for cell_index in range(9):
+        if (self.list_masks_p1[piece_index] >> cell_index) & 1:
+          packed |= (piece_index + 1) << (STATE_DIGIT_BITS * cell_index)
+        if (self.list_masks_p2[piece_index] >> cell_index) & 1:
+          packed |= (5 + piece_index + 1) << (STATE_DIGIT_BITS * cell_index)
+    return GameState(packed)
+
+  def restoreState(self, state):
+    self.list_masks_p1 = [0] * len(self.list_piece_sizes_p1)
+    self.list_masks_p2 = [0] * len(self.list_piece_sizes_p2)
+    for cell_index in range(9):
+      digit = state.getCellDigit(cell_index)
+      if 1 <= digit <= 5:
+        self.list_masks_p1[digit - 1] |= 1 << cell_index
+      elif digit > 5:
+        self.list_masks_p2[digit - 6] |= 1 << cell_index
+    self.pieces_p1 = state.pieces_p1
+    self.pieces_p2 = state.pieces_p2
+    self.updateFromMasks()
+
+  def getCellValue(self, cell_index):
+    ## signed size of the (top) piece in a cell: 0 if the cell is empty
+    bit = 1 << cell_index
+    if self.mask_p1 & bit:
+      for piece_index, mask in enumerate(self.list_masks_p1):
+        if mask & bit:
+          return self.list_piece_sizes_p1[piece_index]
+    if self.mask_p2 & bit:
+      for piece_index, mask in enumerate(self.list_masks_p2):
+        if mask & bit:
+          return self.list_piece_sizes_p2[piece_index]
+    return 0
+
+  def makeMove(self, cell_index, piece_index, player_sgn):
+    ## place a piece, and return the index of the opponent's piece it gobbled (or None).
+    ## no line was complete before it, so only the mover can have completed one.
+    bit = 1 << cell_index
+    captured_index = None
+    if player_sgn > 0:
+      if self.mask_p2 & bit:
+        for captured_index, mask in enumerate(self.list_masks_p2):
+          if mask & bit: break
+        self.list_masks_p2[captured_index] ^= bit
+        self.mask_p2 ^= bit
+        self.hash_board ^= ZOBRIST_P2[cell_index][captured_index]
+      self.list_masks_p1[piece_index] |= bit
+      self.mask_p1 |= bit
+      self.pieces_p1 &= ~(1 << piece_index)
+      self.hash_board ^= ZOBRIST_P1[cell_index][piece_index]
+      if LIST_IS_WIN[self.mask_p1]:
+        self.winner = 1
+    else:
+      if self.mask_p1 & bit:
+        for captured_index, mask in enumerate(self.list_masks_p1):
+          if mask & bit: break
+        self.list_masks_p1[captured_index] ^= bit
+        self.mask_p1 ^= bit
+        self.hash_board ^= ZOBRIST_P1[cell_index][captured_index]
+      self.list_masks_p2[piece_index] |= bit
+      self.mask_p2 |= bit
+      self.pieces_p2 &= ~(1 << piece_index)
+      self.hash_board ^= ZOBRIST_P2[cell_index][piece_index]
+      if LIST_IS_WIN[self.mask_p2]:
+        self.winner = -1
+    return captured_index
+
+  def unmakeMove(self, cell_index, piece_index, player_sgn, captured_index):
+    ## undo `makeMove`: take the piece back and restore any gobbled piece. no move is
+    ## made once a line is complete, so the game was not won before it.
+    bit = 1 << cell_index
+    self.winner = None
+    if player_sgn > 0:
+      self.list_masks_p1[piece_index] ^= bit
+      self.mask_p1 ^= bit
+      self.pieces_p1 |= 1 << piece_index
+      self.hash_board ^= ZOBRIST_P1[cell_index][piece_index]
+      if captured_index is not None:
+        self.list_masks_p2[captured_index] |= bit
+        self.mask_p2 |= bit
+        self.hash_board ^= ZOBRIST_P2[cell_index][captured_index]
+    else:
+      self.list_masks_p2[piece_index] ^= bit
+      self.mask_p2 ^= bit
+      self.pieces_p2 |= 1 << piece_index
+      self.hash_board ^= ZOBRIST_P2[cell_index][piece_index]
+      if captured_index is not None:
+        self.list_masks_p1[captured_index] |= bit
+        self.mask_p1 |= bit
+        self.hash_board ^= ZOBRIST_P1[cell_index][captured_index]
+
+  def evaluate(self):
+    ## static score (for the AI) of a position that has not concluded: see `evaluateBatch`
+    largest_p1 = LIST_LARGEST_SIZE[self.pieces_p1]
+    largest_p2 = LIST_LARGEST_SIZE[self.pieces_p2]
+    ## top pieces that the opponent's largest piece left can gobble
+    mask_capturable_p1 = 0
+    for piece_index in range(largest_p2 - 1):
+      mask_capturable_p1 |= self.list_masks_p1[piece_index]
+    mask_capturable_p2 = 0
+    for piece_index in range(largest_p1 - 1):
+      mask_capturable_p2 |= self.list_masks_p2[piece_index]
+    mask_free = FULL_MASK & ~(self.mask_p1 | self.mask_p2)
+    mask_open_p1 = self.mask_p1 | mask_free | mask_capturable_p2
+    mask_open_p2 = self.mask_p2 | mask_free | mask_capturable_p1
+    raw_score = 0
+    for win_mask in LIST_WIN_MASKS:
+      if (mask_open_p2 & win_mask) == win_mask:
+        raw_score += EVAL_LINE_WEIGHTS[LIST_POPCOUNT[self.mask_p2 & win_mask]]
+      if (mask_open_p1 & win_mask) == win_mask:
+        raw_score -= EVAL_LINE_WEIGHTS[LIST_POPCOUNT[self.mask_p1 & win_mask]]
+    raw_score += EVAL_SAFE_WEIGHT * (LIST_POPCOUNT[self.mask_p2 & ~mask_capturable_p2] - LIST_POPCOUNT[self.mask_p1 & ~mask_capturable_p1])
+    raw_score += EVAL_CAPTURABLE_WEIGHT * (LIST_POPCOUNT[mask_capturable_p2] - LIST_POPCOUNT[mask_capturable_p1])
+    raw_score += EVAL_INVENTORY_WEIGHT * (LIST_INVENTORY[self.pieces_p2] - LIST_INVENTORY[self.pieces_p1])
+    return squashEvaluation(raw_score)
+
+  def getLegalMoves(self, player_sgn):
+    ## (cell_index, piece_index) pairs: cell-major, then smallest piece first. a piece can
+    ## go on the cells that hold neither an own piece nor an opponent piece at least as
+    ## large, so the move set is built from the largest piece down with table lookups.
+    if player_sgn > 0:
+      mask_own, list_masks_opp, pieces = self.mask_p1, self.list_masks_p2, self.pieces_p1
+    else: mask_own, list_masks_opp, pieces = self.mask_p2, self.list_masks_p1, self.pieces_p2
+    move_set = 0
+    mask_cells = 0
+    mask_blocked = mask_own
+    for piece_index in range(len(list_masks_opp)-1, -1, -1):
+      mask_blocked |= list_masks_opp[piece_index]
+      if (pieces >> piece_index) & 1:
+        mask_free = FULL_MASK & ~mask_blocked
+        move_set |= LIST_CELL_SPREAD[mask_free] << piece_index
+        mask_cells |= mask_free
+    list_moves = []
+    for cell_index in LIST_MASK_CELLS[mask_cells]:
+      list_moves += LIST_CELL_MOVES[cell_index][(move_set >> 5*cell_index) & 0b11111]
+    return list_moves
+
+  def orderMoves(self, list_moves, player_sgn, depth, first_move):
+    ## search order: the first move (hash move), winning moves, blocks and captures,
+    ## killer moves, then everything else by history score. the sort is stable, so
+    ## ties keep the generation order (smallest piece first).
+    if not BOOL_MOVE_ORDERING:
+      if (first_move is not None) and (first_move in list_moves):
+        list_moves.remove(first_move)
+        list_moves.insert(0, first_move)
+      return list_moves
+    if player_sgn > 0:
+      mask_own, mask_opp, list_history = self.mask_p1, self.mask_p2, self.list_history_p1
+    else: mask_own, mask_opp, list_history = self.mask_p2, self.mask_p1, self.list_history_p2
+    ## cells that complete a line of the player (win) or of the opponent (block)
+    mask_win = 0
+    mask_block = 0
+    for win_mask in LIST_WIN_MASKS:
+      mask_rest = win_mask & ~mask_own
+      if (mask_rest & (mask_rest - 1)) == 0:
+        mask_win |= mask_rest
+      mask_rest = win_mask & ~mask_opp
+      if (mask_rest & (mask_rest - 1)) == 0:
+        mask_block |= mask_rest
+    mask_tactical = mask_block | mask_opp
+    num_pieces = len(self.list_piece_sizes_p1)
+    list_killers = self.list_killers[depth]
+    def getPriority(move):
+      cell_index, piece_index = move
+      if move == first_move:
+        return PRIORITY_FIRST
+      priority = list_history[num_pieces*cell_index + piece_index]
+      if (mask_win >> cell_index) & 1:
+        return PRIORITY_WIN + priority
+      if (mask_tactical >> cell_index) & 1:
+        return PRIORITY_TACTICAL + priority
+      if move in list_killers:
+        return PRIORITY_KILLER + priority
+      return priority
+    list_moves.sort(key=getPriority, reverse=True)
+    return list_moves
+
+  def updateHeuristics(self, move, player_sgn, depth, draft):
+    ## remember a move that caused a cutoff: as a killer at this depth, and in the history
+    list_killers = self.list_killers[depth]
+    if list_killers[0] != move:
+      list_killers[1] = list_killers[0]
+      list_killers[0] = move
+    list_history = self.list_history_p1 if (player_sgn > 0) else self.list_history_p2
+    list_history[len(self.list_piece_sizes_p1)*move[0] + move[1]] += (draft + 1) * (draft + 1)
+
+  def getPositionKey(self, player_sgn):
+    return getCanonicalKey(self.hash_board, self.pieces_p1, self.pieces_p2, player_sgn)
+
+  def probeTranspositionTable(self, key, sym_index, alpha_score, beta_score, draft):
+    ## returns (score or None if the search has to continue, best move to try first)
+    entry = self.transposition_table.probe(key)
+    if entry is None:
+      return None, None
+    _, tt_score, tt_bound, tt_draft, tt_move, _ = entry
+    ## map the stored (canonical) move back onto this board
+    if tt_move is not None:
+      tt_move = (LIST_SYMMETRIES_INV[sym_index][tt_move[0]], tt_move[1])
+    if (tt_draft >= draft) and ((tt_bound == BOUND_EXACT) or
+        ((tt_bound == BOUND_LOWER) and (tt_score >= beta_score)) or
+        ((tt_bound == BOUND_UPPER) and (tt_score <= alpha_score))):
+      return tt_score, tt_move
+    return None, tt_move
+
+  def storeTranspositionTable(self, key, sym_index, score, alpha_score, beta_score, draft, move):
+    if score <= alpha_score:
+      bound = BOUND_UPPER
+    elif score >= beta_score:
+      bound = BOUND_LOWER
+    else: bound = BOUND_EXACT
+    ## moves are stored in the canonical orientation of the board
+    if move is not None:
+      move = (LIST_SYMMETRIES[sym_index][move[0]], move[1])
+    self.transposition_table.store(key, score, bound, draft, move)
+
+  def loadCachedEntry(self, key):
+    ## copy an earlier session's result for a root position into the transposition table
+    if self.search_cache is None:
+      return
+    cached = self.search_cache.get(key)
+    if cached is None:
+      return
+    score, bound, draft, move = cached
+    entry = self.transposition_table.probe(key)
+    if (entry is None) or (entry[3] < draft):
+      self.transposition_table.store(key, score, bound, draft, divmod(move, 5))
+
+  def saveCachedEntry(self, key):
+    ## persist the transposition table entry of a root position (if it has a move)
+    if self.search_cache is None:
+      return
+    entry = self.transposition_table.probe(key)
+    if (entry is None) or (entry[4] is None):
+      return
+    _, score, bound, draft, (cell_index, piece_index), _ = entry
+    self.search_cache.put(key, score, bound, draft, 5*cell_index + piece_index)
 
   def play(self):
     print(f"You are '{SYMBOL_PLAYER}', and your oponent (an AI) is '{SYMBOL_AI}'.")
@@ -77,8 +827,7 @@ class TicTacToe():
         else:
           ## get user's move
           (x, y), piece_index = self.getPlayerMove()
-          self.board[y][x] = self.list_piece_sizes_p1[piece_index]
-          self.list_piece_flags_p1[piece_index] = 0
+          self.makeMove(3*y + x, piece_index, 1)
           print(" ")
       ## player 2's (AI) turn
       else:
@@ -86,12 +835,25 @@ class TicTacToe():
           print("AI is out of pieces.")
           print(" ")
         else:
-          ## choose best move based on minimax algorithm
-          _, (x, y), piece_index = self.max(-np.inf, np.inf, 0)
+          ## choose best move: look it up in the solved-game table, otherwise use the minimax algorithm
+          self.resetSearchCounters()
+          result = self.lookupSolvedTable()
+          if (result is None) and BOOL_PARALLEL:
+            result = self.searchParallel()
+          if (result is None) and BOOL_BOUNDED:
+            result, bool_cut_short = self.searchBounded(time_budget=TIME_BUDGET)
+            if bool_cut_short:
+              print("The AI's search was cut short by its node or memory budget.")
+          if (result is None) and BOOL_ITERATIVE_DEEPENING:
+            result = self.searchIterativeDeepening()
+          if result is None:
+            result = self.max(-math.inf, math.inf, 0)
+          _, (x, y), piece_index = result
           piece_size = self.list_piece_sizes_p2[piece_index]
-          self.board[y][x] = piece_size
-          self.list_piece_flags_p2[piece_index] = 0
+          self.makeMove(3*y + x, piece_index, -1)
           print(f"The AI's move is: ({x}, {y}), size: {piece_size}.")
+          if self.num_nodes > 0:
+            print(f"Searched {self.num_nodes} nodes (cutoff rate: {100*self.getCutoffRate():.1f}%).")
           print(" ")
       ## increment depth
       depth += 1
@@ -123,7 +885,7 @@ class TicTacToe():
     if (y < 0) or (2 < y):
       return False
     ## check that the target cell is empty or occupied by player 2 (the AI)
-    return self.board[y][x] <= 0
+    return not (self.mask_p1 >> (3*y + x)) & 1
 
   def isSizeValid(self, x, y, piece_index):
     piece_size = self.list_piece_sizes_p1[piece_index]
@@ -134,136 +896,212 @@ class TicTacToe():
     if (piece_size < min(self.list_piece_sizes_p1)) or (max(self.list_piece_sizes_p1) < piece_size):
       return False, 1.2
     ## check if piece is available
-    if self.list_piece_flags_p1[piece_index] == 0:
+    if not (self.pieces_p1 >> piece_index) & 1:
       return False, 2
     ## check that the player does not have a piece placed there
-    if self.board[y][x] > 0:
+    cell_value = self.getCellValue(3*y + x)
+    if cell_value > 0:
       return False, 3
     ## check that the piece being placed has higher value
-    if abs(self.board[y][x]) >= piece_size:
+    if abs(cell_value) >= piece_size:
       return False, 4
     ## everything is okay
     return True, 0
 
+  def lookupSolvedTable(self, player_sgn=-1):
+    ## perfect-play move for a player (the AI by default): the first legal move whose
+    ## resulting position has the best solved score for them (None if there is no
+    ## table, the game has concluded, or no move is found)
+    if (self.solved_table is None) or (self.checkGameOverStatus() is not None):
+      return None
+    best_score = None
+    best_x = None
+    best_y = None
+    best_piece_index = None
+    for cell_index, piece_index in self.getLegalMoves(player_sgn):
+      captured_index = self.makeMove(cell_index, piece_index, player_sgn)
+      key, _ = self.getPositionKey(-player_sgn)
+      self.unmakeMove(cell_index, piece_index, player_sgn, captured_index)
+      score = lookupSolvedValue(self.solved_table, key)
+      if score is None:
+        return None
+      ## scores are for the AI: the AI maximises them, and the player minimises them
+      if (best_score is None) or (-player_sgn * (score - best_score) > 0):
+        best_score = score
+        best_x, best_y = cell_index % 3, cell_index // 3
+        best_piece_index = piece_index
+    if best_score is None:
+      return None
+    return best_score, (best_x, best_y), best_piece_index
+
+  def searchIterativeDeepening(self, time_budget=TIME_BUDGET):
+    ## deepen the AI's search until the time budget runs out, and return the result of
+    ## the deepest fully searched iteration. the first iteration always completes, and
+    ## every iteration searches the previous iteration's best move first.
+    result, _ = self.searchDeepening(time_budget, None)
+    return result
+
+  def searchBounded(self, max_nodes=MAX_NODES, max_memory=MAX_MEMORY, time_budget=None):
+    ## iterative deepening within a budget of `max_nodes` nodes and `max_memory` bytes
+    ## resident in the process (and `time_budget` seconds, if given), so that many
+    ## searches can share a host: returns (result, cut short by the budget). like
+    ## `searchIterativeDeepening`, the first iteration always completes, so there is
+    ## always a move. the search uses no recursion and the transposition table has a
+    ## fixed size, so memory only grows with what the rest of the process allocates.
+    ## (other searches recurse once per ply, which the number of plies in a game bounds.)
+    return self.searchDeepening(time_budget, SearchBudget(max_nodes, max_memory))
+
+  def searchDeepening(self, time_budget, budget):
+    ## the AI's search at increasing depths, until the end of the game is reached or the
+    ## time budget (None: no limit) or `SearchBudget` (None: no limit) runs out:
+    ## (result, cut short by the budget)
+    num_plies_left = bin(self.pieces_p1).count("1") + bin(self.pieces_p2).count("1")
+    state = self.copyState()
+    time_deadline = None if (time_budget is None) else (time.perf_counter() + time_budget)
+    result = None
+    bool_cut_short = False
+    list_scores = []
+    self.root_move = None
+    ## once the depth limit reaches the end of the game, the search is full-width
+    for max_depth in range(1, max(num_plies_left, 1) + 1):
+      self.max_depth = max_depth
+      self.time_deadline = None if (result is None) else time_deadline
+      try:
+        ## static scores alternate between odd and even depths, so the aspiration window
+        ## is centred on the score of the last iteration with the same parity. a bounded
+        ## search keeps the full window, so that an interrupted iteration is still usable.
+        bool_complete = True
+        if budget is not None:
+          score, move, bool_complete = negamaxStack(self, -1, -math.inf, math.inf, 0, budget if (result is not None) else None)
+        elif (len(list_scores) < 2) or not BOOL_ASPIRATION:
+          score, move = negamax(self, -1, -math.inf, math.inf, 0)
+        else: score, move = searchAspiration(self, -1, list_scores[-2], ASPIRATION_WINDOW)
+      except SearchTimeout:
+        ## the search was interrupted between a move and its reset
+        self.restoreState(state)
+        break
+      if not bool_complete:
+        ## the previous best move was searched first, so the best root move found so far
+        ## is at least as good at this depth
+        if move is not None:
+          result = self.getSearchResult(score, move)
+        bool_cut_short = True
+        break
+      result = self.getSearchResult(score, move)
+      list_scores.append(score)
+      if move is None:
+        break
+      self.root_move = move
+      if (time_deadline is not None) and (time.perf_counter() > time_deadline):
+        break
+    self.max_depth = MAX_DEPTH
+    self.time_deadline = None
+    self.root_move = None
+    return result, bool_cut_short
+
+  def searchParallel(self, num_workers=NUM_WORKERS):
+    ## root-split version of `max` (see `tictactoe_negamax.searchRootSplit`): the root
+    ## moves are ordered as in `max`. workers keep their own transposition tables and move
+    ## ordering heuristics, so only full-depth searches are guaranteed to match `max` exactly.
+    if (self.checkGameOverStatus() is not None) or (num_workers < 2) or (self.max_depth < 1):
+      return self.max(-math.inf, math.inf, 0)
+    tt_move = None
+    if self.bool_transposition:
+      self.transposition_table.newSearch()
+      key, sym_index = self.getPositionKey(-1)
+      self.loadCachedEntry(key)
+      tt_score, tt_move = self.probeTranspositionTable(key, sym_index, -math.inf, math.inf, self.max_depth)
+      if (tt_score is not None) and (tt_move is not None):
+        return self.getSearchResult(tt_score, tt_move)
+    list_moves = self.orderMoves(self.getLegalMoves(-1), -1, 0, tt_move)
+    if len(list_moves) < 2:
+      return self.max(-math.inf, math.inf, 0)
+    executor = getExecutor(self, num_workers, initialiseWorker)
+    score, move = searchRootSplit(self, -1, list_moves, executor, searchWorkerRootMove, (self.copyState(), self.max_depth))
+    return self.getSearchResult(score, move)
+
   def max(self, alpha_score, beta_score, depth=0):
-    ## check if the game has concluded
-    status = self.checkGameOverStatus()
-    if status is not None:
-      if BOOL_DEBUG:
-        self.printBoard()
-        appendToLogFile(f"AI: End of search. Game status: {status}")
-        appendToLogFile(" ")
-      return -1*status, (None, None), None
-    ## initialise to worst case
-    max_score = -np.inf
-    max_x = None
-    max_y = None
-    max_piece_index = None
-    ## loop over possible moves
-    for y_index in range(3):
-      for x_index in range(3):
-        for piece_index in [
-            index for index, flag in enumerate(self.list_piece_flags_p2)
-            if abs(flag) > 0
-          ]:
-          ## (spot is free or occupied by player) and (player's piece is smaller)
-          if ((self.board[y_index][x_index] >= 0) and
-              (abs(self.board[y_index][x_index]) < abs(self.list_piece_sizes_p2[piece_index]))):
-            ## make temporary AI move
-            if BOOL_DEBUG:
-              appendToLogFile(f"AI: ({x_index}, {y_index}), p_old = {self.board[y_index][x_index]}, p_new = {self.list_piece_sizes_p2[piece_index]}")
-            prev_piece = self.board[y_index][x_index]
-            self.board[y_index][x_index] = self.list_piece_sizes_p2[piece_index]
-            self.list_piece_flags_p2[piece_index] = 0
-            ## determine the best move that the player can play
-            score, _, _ = self.min(alpha_score, beta_score, depth+1)
-            if (score > max_score):
-              max_score = score
-              max_x, max_y = x_index, y_index
-              max_piece_index = piece_index
-            ## reset: remove temporary AI move
-            self.board[y_index][x_index] = prev_piece
-            self.list_piece_flags_p2[piece_index] = 1
-            ## something
-            if (max_score >= beta_score) or (depth >= MAX_DEPTH):
-              return max_score, (max_x, max_y), max_piece_index
-            if max_score > alpha_score:
-              alpha_score = max_score
-    return max_score, (max_x, max_y), max_piece_index
+    ## the AI's best score and move, searched by `negamax`
+    score, move = negamax(self, -1, alpha_score, beta_score, depth)
+    return self.getSearchResult(score, move)
 
   def min(self, alpha_score, beta_score, depth=0):
-    ## check if the game has concluded
-    status = self.checkGameOverStatus()
-    if status is not None:
-      if BOOL_DEBUG:
-        self.printBoard()
-        appendToLogFile(f"P1: End of search. Game status: {status}")
-        appendToLogFile(" ")
-      return -1*status, (None, None), None
-    ## initialise to worst case
-    min_score = np.inf
-    min_x = None
-    min_y = None
-    min_piece_index = None
-    ## loop over possible moves
-    for y_index in range(3):
-      for x_index in range(3):
-        for piece_index in [
-            index for index, flag in enumerate(self.list_piece_flags_p1)
-            if abs(flag) > 0
-          ]:
-          ## (spot is free or occupied by AI) and (AI's piece is smaller)
-          if ((self.board[y_index][x_index] <= 0) and
-              (abs(self.board[y_index][x_index]) < abs(self.list_piece_sizes_p1[piece_index]))):
-            ## make temporary player move
-            if BOOL_DEBUG:
-              appendToLogFile(f"P1: ({y_index}, {x_index}), p_old = {self.board[y_index][x_index]}, p_new = {self.list_piece_sizes_p1[piece_index]}")
-            prev_piece = self.board[y_index][x_index]
-            self.board[y_index][x_index] = self.list_piece_sizes_p1[piece_index]
-            self.list_piece_flags_p1[piece_index] = 0
-            ## determine the best move that the AI can play
-            score, _, _ = self.max(alpha_score, beta_score, depth+1)
-            if (score < min_score):
-              min_score = score
-              min_x, min_y = x_index, y_index
-              min_piece_index = piece_index
-            ## reset: remove temporary player move
-            self.board[y_index][x_index] = prev_piece
-            self.list_piece_flags_p1[piece_index] = 1
-            ## something
-            if (min_score <= alpha_score) or (depth >= MAX_DEPTH):
-              return min_score, (min_x, min_y), min_piece_index
-            if min_score < beta_score:
-              beta_score = min_score
-    return min_score, (min_x, min_y), min_piece_index
+    ## the player's best move, and its score for the AI
+    value, move = negamax(self, 1, -beta_score, -alpha_score, depth)
+    return self.getSearchResult(-value, move)
+
+  def getSearchResult(self, score, move):
+    if move is None:
+      return score, (None, None), None
+    cell_index, piece_index = move
+    return score, (cell_index % 3, cell_index // 3), piece_index
+
+  ## rules interface of `tictactoe_negamax`: moves are (cell_index, piece_index) pairs,
+  ## and the transposition table keeps scores for the AI
+  def checkSearchLimits(self, depth):
+    ## depth limit: score the position statically
+    if (depth > 0) and (depth >= self.max_depth):
+      return self.evaluate()
+    ## give up once the iterative deepening time budget has run out
+    if (self.time_deadline is not None) and (time.perf_counter() > self.time_deadline):
+      raise SearchTimeout()
+    return None
+
+  def getSearchMoves(self, player_sgn, depth, first_move):
+    ## the previous iteration's best move is searched first
+    if (depth == 0) and (self.root_move is not None):
+      first_move = self.root_move
+    return self.orderMoves(self.getLegalMoves(player_sgn), player_sgn, depth, first_move)
+
+  def makeSearchMove(self, move, player_sgn):
+    captured_index = self.makeMove(move[0], move[1], player_sgn)
+    if BOOL_DEBUG:
+      self.trace.record(formatTraceMove, player_sgn, move[0], move[1], captured_index)
+      status = self.checkGameOverStatus()
+      if status is not None:
+        self.traceBoard()
+        self.trace.record(formatTraceEnd, -player_sgn, status)
+    return captured_index
+
+  def unmakeSearchMove(self, move, player_sgn, captured_index):
+    self.unmakeMove(move[0], move[1], player_sgn, captured_index)
+
+  def probeSearchTable(self, player_sgn, depth, alpha, beta):
+    ## look up previous searches of this position (or any of its symmetries)
+    if not self.bool_transposition:
+      return None, None, None
+    if depth == 0:
+      self.transposition_table.newSearch()
+    key, sym_index = self.getPositionKey(player_sgn)
+    if depth == 0:
+      self.loadCachedEntry(key)
+    draft = max(self.max_depth - depth, 0)
+    if player_sgn < 0:
+      tt_score, tt_move = self.probeTranspositionTable(key, sym_index, alpha, beta, draft)
+      return tt_score, tt_move, (key, sym_index)
+    tt_score, tt_move = self.probeTranspositionTable(key, sym_index, -beta, -alpha, draft)
+    return (None if (tt_score is None) else -tt_score), tt_move, (key, sym_index)
+
+  def storeSearchTable(self, entry, player_sgn, depth, value, alpha, beta, move):
+    if entry is None:
+      return
+    key, sym_index = entry
+    draft = max(self.max_depth - depth, 0)
+    if player_sgn < 0:
+      self.storeTranspositionTable(key, sym_index, value, alpha, beta, draft, move)
+    else: self.storeTranspositionTable(key, sym_index, -value, -beta, -alpha, draft, move)
+    if depth == 0:
+      self.saveCachedEntry(key)
+
+  def recordCutoff(self, move, player_sgn, depth):
+    self.updateHeuristics(move, player_sgn, depth, max(self.max_depth - depth, 0))
 
   def checkGameOverStatus(self):
-    ## check for wins: player 1 and 2, respectively
-    for player_sgn in [1, -1]:
-      ## check if a horizontal win occured
-      for y_index in range(3):
-        if ((player_sgn * self.board[y_index][0] > 0) and 
-            (player_sgn * self.board[y_index][1] > 0) and
-            (player_sgn * self.board[y_index][2] > 0)):
-          return player_sgn
-      ## check if a vertical win occured
-      for x_index in range(3):
-        if ((player_sgn * self.board[0][x_index] > 0) and
-            (player_sgn * self.board[1][x_index] > 0) and
-            (player_sgn * self.board[2][x_index] > 0)):
-          return player_sgn
-      ## check if a top-left to bottom-right diagonal win soccured
-      if ((player_sgn * self.board[0][0] > 0) and
-          (player_sgn * self.board[1][1] > 0) and
-          (player_sgn * self.board[2][2] > 0)):
-        return player_sgn
-      ## check if a top-right to bottom-left diagonal win occured
-      if ((player_sgn * self.board[0][2] > 0) and
-          (player_sgn * self.board[1][1] > 0) and
-          (player_sgn * self.board[2][0] > 0)):
-        return player_sgn
+    ## check for wins (rows, columns and diagonals), tracked by `makeMove`
+    if self.winner is not None:
+      return self.winner
     ## check if any pieces are still remaining
-    if any(self.list_piece_flags_p1) or any(self.list_piece_flags_p2):
+    if self.pieces_p1 or self.pieces_p2:
       return None
     ## it is a tie
     return 0
@@ -290,21 +1128,20 @@ class TicTacToe():
     ])
     print(" ")
     if BOOL_DEBUG:
-      appendToLogFile(self.board)
-      appendToLogFile("Player 1's pieces:")
-      appendToLogFile([
-        f"x{abs(piece_size)}"
-        for piece_index, piece_size in enumerate(self.list_piece_sizes_p1)
-        if self.list_piece_flags_p1[piece_index] > 0
-      ])
-      appendToLogFile("Player 2's pieces:")
-      appendToLogFile([
-        f"o{abs(piece_size)}" for piece_index, piece_size in enumerate(self.list_piece_sizes_p2)
-        if self.list_piece_flags_p2[piece_index] > 0
-      ])
+      self.traceBoard()
+
+  def traceBoard(self):
+    ## only the masks are recorded: the board is drawn by the trace log's writer thread
+    self.trace.record(
+      formatTraceBoard,
+      tuple(self.list_masks_p1), tuple(self.list_masks_p2), self.pieces_p1, self.pieces_p2
+    )
 
   def tests(self):
+    ## the searches below must not read or write the search cache
+    search_cache, self.search_cache = self.search_cache, None
     ## test: draw/index board correctly
+    import numpy as np
     list_board = [ 3, 1, -5, 4, 5, 0, -2, 0, -4]
     self.board = np.array([
       [ 3,  1, -5],
@@ -342,14 +1179,16 @@ class TicTacToe():
         raise Exception(f"Failed test: detect off-diagonal win. Info: {val}")
       ## test: row win
       for x_index in range(3):
-        self.board = np.zeros((3,3))
-        self.board[:, x_index] = val
+        board = np.zeros((3,3))
+        board[:, x_index] = val
+        self.board = board
         if not (self.checkGameOverStatus() == val):
           raise Exception(f"Failed test: detect row win. Info: {x_index} {val}")
       ## test: column win
       for y_index in range(3):
-        self.board = np.zeros((3,3))
-        self.board[y_index, :] = val
+        board = np.zeros((3,3))
+        board[y_index, :] = val
+        self.board = board
         if not (self.checkGameOverStatus() == val):
           raise Exception(f"Failed test: detect column win. Info: {y_index} {val}")
     ## test: detect drawn game
@@ -363,6 +1202,11 @@ class TicTacToe():
     result = self.checkGameOverStatus()
     if (result != 0):
       raise Exception(f"Failed test 6: detect drawn position. Info: {result}")
+    ## test: batch evaluation agrees with the single board checks
+    array_boards = np.array([self.board, 3*np.eye(3), -np.eye(3)[::-1], np.eye(3) - np.eye(3)[::-1]], dtype=np.int8)
+    array_status = checkGameOverStatusBatch(array_boards, [0, 1, 1, 1])
+    if not np.array_equal(array_status, [0, 1, -1, STATUS_ONGOING]):
+      raise Exception(f"Failed test: batch evaluation. Info: {array_status}")
     ## test: AI makes correct move
     self.list_piece_flags_p1 = [0, 0, 1, 1, 1]
     self.list_piece_flags_p2 = [0, 1, 1, 1, 1]
@@ -371,10 +1215,9 @@ class TicTacToe():
       [ 0,  2,  0],
       [ 0,  0,  0]
     ])
-    _, (x, y), piece_index = self.max(-np.inf, np.inf)
+    _, (x, y), piece_index = self.max(-math.inf, math.inf)
     piece_size = self.list_piece_sizes_p2[piece_index]
-    self.board[y][x] = piece_size
-    self.list_piece_flags_p2[piece_index] = 0
+    self.makeMove(3*y + x, piece_index, -1)
     bool_good_move_1 = (x == 1) and (y == 0)
     bool_good_move_2 = (x == 1) and (y == 1)
     bool_good_move_3 = (x == 1) and (y == 2)
@@ -385,16 +1228,136 @@ class TicTacToe():
       self.printBoard()
     if not ((bool_good_move_1 or bool_good_move_2) or (bool_good_move_3)):
       raise Exception(f"Failed test 2: make best move. (x, y)=({x}, {y}) and s={self.list_piece_sizes_p2[piece_index]}")
+    ## test: a concluded game has no solved move, and the lookup leaves it concluded
+    self.initialise()
+    self.list_piece_flags_p1 = [1, 0, 0, 1, 1]
+    self.list_piece_flags_p2 = [1, 1, 1, 0, 0]
+    self.board = np.array([
+      [ 1,  2,  3],
+      [ 0, -4,  0],
+      [ 0,  0, -5]
+    ])
+    result = self.lookupSolvedTable(-1)
+    if (result is not None) or (self.checkGameOverStatus() != 1):
+      raise Exception(f"Failed test: terminal position. Info: {result} {self.checkGameOverStatus()}")
+    ## test: a bounded search cut short still returns a legal move, and leaves the position unchanged
+    self.initialise()
+    self.makeMove(4, 2, 1)
+    state = self.copyState()
+    (_, (x, y), piece_index), bool_cut_short = self.searchBounded(max_nodes=500, max_memory=None)
+    if not (bool_cut_short and ((3*y + x, piece_index) in self.getLegalMoves(-1)) and (self.copyState() == state)):
+      raise Exception(f"Failed test: bounded search. Info: {bool_cut_short} ({x}, {y}) {piece_index}")
+    ## test: scores are the same with and without the transposition table, on all 8
+    ## symmetric positions (which share its entries, with their moves mapped), and every
+    ## move returned is legal and as good as the best one. a position is always reached
+    ## at the same depth, so the table only changes a search's nodes.
+    bool_transposition = self.bool_transposition
+    for list_moves, max_depth in [
+        ([(0, 2, 1)], 5),
+        ([(4, 1, 1), (2, 2, -1), (6, 3, 1)], 5),
+        ([(4, 0, 1), (0, 0, -1), (1, 0, 1)], 2 * len(self.list_piece_sizes_p1)),
+        ([(4, 1, 1), (4, 3, -1), (0, 3, 1)], 2 * len(self.list_piece_sizes_p1))
+      ]:
+      self.max_depth = max_depth
+      self.transposition_table.clear()
+      self.initialise()
+      for cell_index, piece_index, player_sgn in list_moves:
+        self.makeMove(cell_index, piece_index, player_sgn)
+      state = self.copyState()
+      list_scores = []
+      for list_perm in LIST_SYMMETRIES:
+        packed = state.packed & ~((1 << STATE_PIECES_SHIFT_P1) - 1)
+        for cell_index in range(9):
+          packed |= state.getCellDigit(cell_index) << (STATE_DIGIT_BITS * list_perm[cell_index])
+        self.restoreState(GameState(packed))
+        list_results = []
+        for bool_table in [True, False]:
+          self.bool_transposition = bool_table
+          list_results.append(self.max(-math.inf, math.inf))
+        ## moves are scored without the table
+        for score, (x, y), piece_index in list_results:
+          list_scores.append(score)
+          move = (3*y + x, piece_index)
+          if (move not in self.getLegalMoves(-1)) or (searchRootMove(self, -1, move, -math.inf) != score):
+            raise Exception(f"Failed test: transposition table move. Info: {list_moves} {max_depth} {list_perm} {move} {score}")
+      if len(set(list_scores)) != 1:
+        raise Exception(f"Failed test: transposition table score. Info: {list_moves} {max_depth} {list_scores}")
+    self.bool_transposition = bool_transposition
+    self.max_depth = MAX_DEPTH
+    ## test: `GameState` follows the game through random games. `apply` matches `makeMove`,
+    ## distinct positions have distinct keys (symmetric ones share theirs), and a restored
+    ## state gives back the same masks, side to move and winner.
+    rng = random.Random(0)
+    dict_keys = {}
+    game = TicTacToe()
+    for _ in range(50):
+      self.initialise()
+      state = GameState()
+      player_sgn = 1
+      while (self.checkGameOverStatus() is None) and (len(self.getLegalMoves(player_sgn)) > 0):
+        cell_index, piece_index = rng.choice(self.getLegalMoves(player_sgn))
+        self.makeMove(cell_index, piece_index, player_sgn)
+        state = state.apply((cell_index, piece_index))
+        player_sgn = -player_sgn
+        game.restoreState(state)
+        position, _ = canonicalizeCells([state.getCellDigit(cell_index) for cell_index in range(9)])
+        position = (position, state.pieces_p1, state.pieces_p2)
+        if ((self.copyState() != state) or (state.key() != self.getPositionKey(player_sgn)[0]) or
+            (dict_keys.setdefault(state.key(), position) != position)):
+          raise Exception(f"Failed test: game state key. Info: {state}")
+        if ((game.list_masks_p1 != self.list_masks_p1) or (game.list_masks_p2 != self.list_masks_p2) or
+            (game.hash_board != self.hash_board) or (state.player_sgn != player_sgn) or
+            (game.winner != self.winner) or (state.winner != self.winner)):
+          raise Exception(f"Failed test: game state round trip. Info: {state}")
+    ## test: `apply` rejects a covered cell that is not a smaller opponent piece, a played
+    ## piece and a concluded game
+    state = GameState().apply((4, 2)).apply((0, 1))
+    for move in [(4, 3), (0, 1), (1, 2)]:
+      try:
+        state.apply(move)
+      except ValueError:
+        continue
+      raise Exception(f"Failed test: illegal game state move. Info: {move}")
+    state = state.apply((0, 3)).apply((8, 4)).apply((3, 4)).apply((1, 0)).apply((6, 0))
+    if state.winner != 1:
+      raise Exception(f"Failed test: game state winner. Info: {state}")
+    try:
+      state.apply((7, 1))
+    except ValueError:
+      pass
+    else: raise Exception("Failed test: game state move after the game concluded.")
     ## success
+    self.search_cache = search_cache
     print("Passed all tests.")
     print(" ")
 
 
+## ###################
+## PARALLEL SEARCH WORKERS
+## ###################
+worker_game = None
+
+def initialiseWorker():
+  global worker_game
+  ## each worker process writes its own search trace
+  worker_game = TicTacToe(f"{os.path.splitext(TRACE_PATH)[0]}_{os.getpid()}.txt")
+
+def searchWorkerRootMove(state, max_depth, player_sgn, move, alpha):
+  ## worker entry point of `searchRootSplit`: value of one root move, and the nodes it took
+  worker_game.restoreState(state)
+  worker_game.max_depth = max_depth
+  worker_game.resetSearchCounters()
+  return searchRootMove(worker_game, player_sgn, move, alpha), worker_game.num_nodes
+
+
 ## ###################
 ## DEFINE MAIN PROGRAM
 ## ###################
 def main():
+  os.system("clear")
   game = TicTacToe()
+  if BOOL_DEBUG:
+    game.tests()
   game.play()
 
 
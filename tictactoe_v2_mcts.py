@@ -0,0 +1,290 @@
+import math, time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import tictactoe_v2 as v2
+import tictactoe_v2_solver as solver
+
+
+## ###################
+## PROGRAM PARAMETERS
+## ###################
+NUM_SIMULATIONS = 2000 ## simulations per search (when there is no time budget)
+TIME_BUDGET     = None ## wall-clock seconds per search (overrides NUM_SIMULATIONS)
+EXPLORATION     = math.sqrt(2) ## UCT exploration constant
+LEAF_BATCH_SIZE = 32 ## leaves selected before their rollouts are played together
+NUM_ROLLOUTS    = 4 ## random playouts per leaf
+NUM_WORKERS     = 0 ## processes for the rollouts (0: play them in this process)
+
+
+## ###################
+## ROLLOUTS
+## ###################
+## positions are `tictactoe_v2.GameState` packed ints (as uint64), so rollouts can play
+## many of them at once with NumPy
+ARRAY_PIECE_SIZES = np.arange(1, solver.NUM_PIECES + 1)
+
+def rolloutBatch(array_states, array_ai_to_move, rng):
+  ## play every position to the end with uniformly random legal moves, and return the
+  ## outcomes (for the AI). all positions move at once: each step is a few array ops.
+  array_states = np.array(array_states, dtype=np.uint64)
+  array_ai_to_move = np.array(array_ai_to_move, dtype=bool)
+  array_values = np.zeros(len(array_states), dtype=np.int8)
+  array_live = np.arange(len(array_states))
+  while len(array_live) > 0:
+    array_chunk = array_states[array_live]
+    array_status = solver.getStatus(array_chunk)
+    bool_finished = array_status != v2.STATUS_ONGOING
+    array_values[array_live[bool_finished]] = -1 * array_status[bool_finished]
+    array_live = array_live[~bool_finished]
+    array_chunk = array_chunk[~bool_finished]
+    bool_ai = array_ai_to_move[array_live]
+    ## legal (piece, cell) pairs: a piece still in hand, on a free cell or a smaller opponent piece
+    array_digits = np.stack(solver.getDigits(array_chunk), axis=1)
+    array_pieces = np.where(
+      bool_ai,
+      solver.getPieces(array_chunk, solver.PIECES_SHIFT_P2),
+      solver.getPieces(array_chunk, solver.PIECES_SHIFT_P1)
+    )
+    bool_has_piece = ((array_pieces[:, None] >> np.arange(solver.NUM_PIECES)) & 1).astype(bool)
+    array_opp_sizes = np.where(
+      bool_ai[:, None],
+      np.where(array_digits <= solver.NUM_PIECES, array_digits, 0),
+      np.where(array_digits > solver.NUM_PIECES, array_digits - solver.NUM_PIECES, 0)
+    )
+    bool_legal = bool_has_piece[:, :, None] & (
+      (array_digits == 0)[:, None, :] |
+      ((array_opp_sizes > 0)[:, None, :] & (array_opp_sizes[:, None, :] < ARRAY_PIECE_SIZES[None, :, None]))
+    )
+    bool_legal = bool_legal.reshape(len(array_chunk), solver.NUM_PIECES * 9)
+    ## a side that still has pieces but no legal move loses
+    bool_stuck = ~np.any(bool_legal, axis=1)
+    array_values[array_live[bool_stuck]] = np.where(bool_ai[bool_stuck], -1, 1)
+    array_live = array_live[~bool_stuck]
+    array_chunk = array_chunk[~bool_stuck]
+    bool_ai = bool_ai[~bool_stuck]
+    bool_legal = bool_legal[~bool_stuck]
+    ## uniformly random legal move
+    array_choices = np.argmax(np.where(bool_legal, rng.random(bool_legal.shape), -1.0), axis=1)
+    array_piece_indices = array_choices // 9
+    array_shifts = (solver.DIGIT_BITS * (array_choices % 9)).astype(np.uint64)
+    array_new_digits = np.where(bool_ai, solver.NUM_PIECES + 1, 1) + array_piece_indices
+    array_chunk &= ~(solver.DIGIT_MASK << array_shifts)
+    array_chunk |= array_new_digits.astype(np.uint64) << array_shifts
+    array_pieces_shifts = np.where(bool_ai, solver.PIECES_SHIFT_P2, solver.PIECES_SHIFT_P1) + array_piece_indices
+    array_chunk &= ~(np.uint64(1) << array_pieces_shifts.astype(np.uint64))
+    array_states[array_live] = array_chunk
+    array_ai_to_move[array_live] = ~bool_ai
+  return array_values
+
+def rolloutWorker(array_states, array_ai_to_move, seed):
+  ## `rolloutBatch` in a worker process
+  return rolloutBatch(array_states, array_ai_to_move, np.random.default_rng(seed))
+
+
+## ###################
+## SEARCH TREE
+## ###################
+class TreeNode():
+  ## `player_sgn` is the side to move, `move` the (cell_index, piece_index) that led
+  ## here, and `total_value` the sum of the (AI's) outcomes of the simulations through
+  ## it. `terminal_value` is set when the game is over: a win, tie or stuck side.
+  __slots__ = (
+    "state", "player_sgn", "move", "parent", "list_children", "list_untried",
+    "num_visits", "total_value", "terminal_value"
+  )
+
+  def __init__(self, game, player_sgn, move=None, parent=None):
+    self.state = game.copyState().packed
+    self.player_sgn = player_sgn
+    self.move = move
+    self.parent = parent
+    self.list_children = []
+    self.num_visits = 0
+    self.total_value = 0.0
+    self.terminal_value = None
+    status = game.checkGameOverStatus()
+    if status is not None:
+      self.terminal_value = -1 * status
+      self.list_untried = []
+      return
+    self.list_untried = game.getLegalMoves(player_sgn)
+    if len(self.list_untried) == 0:
+      self.terminal_value = player_sgn
+
+  def selectChild(self, exploration):
+    ## UCT: the side to move picks the child with the best upper confidence bound
+    log_visits = math.log(self.num_visits)
+    value_sgn = -self.player_sgn
+    return max(
+      self.list_children,
+      key=lambda child: value_sgn * child.total_value / child.num_visits + exploration * math.sqrt(log_visits / child.num_visits)
+    )
+
+
+## ###################
+## SEARCH
+## ###################
+class MonteCarloTreeSearch():
+  ## UCT search on a `tictactoe_v2.TicTacToe` game. leaves are selected in batches
+  ## (each selection counts as a visit straight away, so a batch spreads over the tree),
+  ## then all of their rollouts are played at once. the subtree of the position reached
+  ## after the next two moves is kept for the following search.
+  def __init__(
+      self, num_simulations=NUM_SIMULATIONS, time_budget=TIME_BUDGET, exploration=EXPLORATION,
+      leaf_batch_size=LEAF_BATCH_SIZE, num_rollouts=NUM_ROLLOUTS, num_workers=NUM_WORKERS, seed=None
+    ):
+    self.num_simulations = num_simulations
+    self.time_budget = time_budget
+    self.exploration = exploration
+    self.leaf_batch_size = leaf_batch_size
+    self.num_rollouts = num_rollouts
+    self.num_workers = num_workers
+    self.rng = np.random.default_rng(seed)
+    self.root = None
+    self.executor = None
+
+  def close(self):
+    ## stop the rollout worker processes (they are started again if needed)
+    if self.executor is not None:
+      self.executor.shutdown()
+      self.executor = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def getRoot(self, game, player_sgn):
+    ## reuse the node of this position if it is in the previous tree (at most two moves deep)
+    state = game.copyState().packed
+    if self.root is not None:
+      list_nodes = [self.root]
+      for _ in range(3):
+        for node in list_nodes:
+          if (node.state == state) and (node.player_sgn == player_sgn):
+            node.parent = None
+            return node
+        list_nodes = [child for node in list_nodes for child in node.list_children]
+    return TreeNode(game, player_sgn)
+
+  def selectLeaf(self, game, root):
+    ## walk down the tree (making the moves on `game`) and expand one new node
+    node = root
+    list_path = []
+    while node.terminal_value is None:
+      if len(node.list_untried) > 0:
+        move = node.list_untried.pop(self.rng.integers(len(node.list_untried)))
+        list_path.append((move, node.player_sgn, game.makeMove(move[0], move[1], node.player_sgn)))
+        child = TreeNode(game, -node.player_sgn, move, node)
+        node.list_children.append(child)
+        node = child
+        break
+      node = node.selectChild(self.exploration)
+      list_path.append((node.move, node.parent.player_sgn, game.makeMove(node.move[0], node.move[1], node.parent.player_sgn)))
+    for (cell_index, piece_index), player_sgn, captured_index in reversed(list_path):
+      game.unmakeMove(cell_index, piece_index, player_sgn, captured_index)
+    return node
+
+  def backPropagate(self, node, value):
+    while node is not None:
+      node.total_value += value
+      node = node.parent
+
+  def rollout(self, list_leaves):
+    ## mean rollout outcome of every leaf
+    array_states = np.repeat(np.array([leaf.state for leaf in list_leaves], dtype=np.uint64), self.num_rollouts)
+    array_ai_to_move = np.repeat(np.array([leaf.player_sgn < 0 for leaf in list_leaves]), self.num_rollouts)
+    if self.num_workers > 1:
+      if self.executor is None:
+        self.executor = ProcessPoolExecutor(self.num_workers)
+      array_seeds = self.rng.integers(1 << 32, size=self.num_workers)
+      array_values = np.concatenate(list(self.executor.map(
+        rolloutWorker,
+        np.array_split(array_states, self.num_workers),
+        np.array_split(array_ai_to_move, self.num_workers),
+        array_seeds
+      )))
+    else: array_values = rolloutBatch(array_states, array_ai_to_move, self.rng)
+    return array_values.reshape(len(list_leaves), self.num_rollouts).mean(axis=1)
+
+  def search(self, game, player_sgn=-1):
+    ## best move for a player (the AI by default), as (score, (x, y), piece_index) like
+    ## `TicTacToe.max`: the most visited root move, and its mean outcome for the AI
+    root = self.getRoot(game, player_sgn)
+    self.root = root
+    time_deadline = None if (self.time_budget is None) else time.perf_counter() + self.time_budget
+    num_simulations = 0
+    while root.terminal_value is None:
+      ## without a deadline, the last batch stops at exactly `num_simulations`
+      batch_size = self.leaf_batch_size
+      if time_deadline is None:
+        if num_simulations >= self.num_simulations:
+          break
+        batch_size = min(batch_size, self.num_simulations - num_simulations)
+      elif (num_simulations > 0) and (time.perf_counter() > time_deadline):
+        break
+      list_leaves = []
+      for _ in range(batch_size):
+        node = self.selectLeaf(game, root)
+        num_simulations += 1
+        ## count the visit now, so the rest of the batch explores elsewhere
+        visit_node = node
+        while visit_node is not None:
+          visit_node.num_visits += 1
+          visit_node = visit_node.parent
+        if node.terminal_value is not None:
+          self.backPropagate(node, node.terminal_value)
+        else: list_leaves.append(node)
+      if len(list_leaves) > 0:
+        for leaf, value in zip(list_leaves, self.rollout(list_leaves)):
+          self.backPropagate(leaf, value)
+    game.num_nodes += num_simulations
+    if len(root.list_children) == 0:
+      return root.terminal_value, (None, None), None
+    best_child = max(root.list_children, key=lambda child: child.num_visits)
+    cell_index, piece_index = best_child.move
+    return float(best_child.total_value / best_child.num_visits), (cell_index % 3, cell_index // 3), piece_index
+
+  def tests(self):
+    settings = (self.num_simulations, self.time_budget, self.leaf_batch_size, self.num_workers, self.root)
+    ## test: without a time budget, a search runs exactly `num_simulations` simulations,
+    ## though that is not a multiple of the batch size, and `close` stops the worker processes
+    self.num_simulations, self.time_budget, self.leaf_batch_size, self.num_workers = 100, None, 32, 2
+    self.root = None
+    game = v2.TicTacToe()
+    game.makeMove(4, 2, 1)
+    with self:
+      _, (x, y), piece_index = self.search(game)
+      executor = self.executor
+    if (game.num_nodes != self.num_simulations) or (self.root.num_visits != self.num_simulations):
+      raise Exception(f"Failed test: number of simulations. Info: {game.num_nodes} {self.root.num_visits}")
+    if (3*y + x, piece_index) not in game.getLegalMoves(-1):
+      raise Exception(f"Failed test: legal move. Info: ({x}, {y}) {piece_index}")
+    if (executor is None) or (self.executor is not None):
+      raise Exception("Failed test: worker processes. Info: the search did not start them, or close did not stop them.")
+    try:
+      executor.submit(int)
+    except RuntimeError:
+      pass
+    else: raise Exception("Failed test: worker processes. Info: the executor was not shut down.")
+    ## success
+    self.num_simulations, self.time_budget, self.leaf_batch_size, self.num_workers, self.root = settings
+    print("Passed all tests.")
+
+
+## ###################
+## DEFINE MAIN PROGRAM
+## ###################
+def main():
+  MonteCarloTreeSearch().tests()
+
+
+## ###################
+## RUN MAIN
+## ###################
+if __name__ == "__main__":
+  main()
+
+
+## END OF PROGRAM
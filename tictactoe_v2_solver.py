@@ -0,0 +1,300 @@
+import os, sys, time, tempfile
+import numpy as np
+import tictactoe_v2 as v2
+from tictactoe_tables import canonicalizeBatch
+
+
+## ###################
+## PROGRAM PARAMETERS
+## ###################
+## number of states expanded or solved at once, of successor states held before they are
+## written to disk, and of entries held while merging sorted runs: bounds the memory used
+CHUNK_SIZE = 1 << 17
+NUM_PIECES = 5
+NUM_PLIES  = 2 * NUM_PIECES
+
+
+## ###################
+## STATE ENCODING
+## ###################
+## states are `tictactoe_v2.GameState` packed ints, as uint64: cell c holds a 4-bit digit
+## at bit 4*c (0: free, 1-5: player piece of that size, 6-10: AI piece of size digit-5),
+## followed by the remaining pieces of the player (bits 36-40) and of the AI (bits
+## 41-45). the side to move follows from the ply: the player moves on even plies.
+DIGIT_BITS    = v2.STATE_DIGIT_BITS
+DIGIT_MASK    = np.uint64(v2.STATE_DIGIT_MASK)
+BOARD_MASK    = np.uint64((1 << (9 * DIGIT_BITS)) - 1)
+PIECES_SHIFT_P1 = v2.STATE_PIECES_SHIFT_P1
+PIECES_SHIFT_P2 = v2.STATE_PIECES_SHIFT_P2
+
+def getInitialState():
+  return np.array([v2.GameState().packed], dtype=np.uint64)
+
+def getDigits(array_states):
+  return [
+    ((array_states >> np.uint64(DIGIT_BITS * cell_index)) & DIGIT_MASK).astype(np.int8)
+    for cell_index in range(9)
+  ]
+
+def getPieces(array_states, pieces_shift):
+  return ((array_states >> np.uint64(pieces_shift)) & np.uint64((1 << NUM_PIECES) - 1)).astype(np.int64)
+
+def getCanonicalStates(array_states):
+  ## one packed encoding for the 8 symmetric boards: the canonical form of `canonicalizeBatch`
+  ## (pieces in hand are unchanged)
+  array_digits, _ = canonicalizeBatch(np.stack(getDigits(array_states), axis=1))
+  array_shifts = np.arange(9, dtype=np.uint64) * np.uint64(DIGIT_BITS)
+  array_board = np.bitwise_or.reduce(array_digits.astype(np.uint64) << array_shifts, axis=1)
+  return (array_states & ~BOARD_MASK) | array_board
+
+
+## ###################
+## ZOBRIST KEYS
+## ###################
+## unpack the engine's zobrist lanes, so states are keyed exactly like `TicTacToe.getPositionKey`
+def createZobristArrays():
+  array_cell_hashes = np.zeros((len(v2.LIST_SYMMETRIES), 9, 1 + 2*NUM_PIECES), dtype=np.uint64)
+  for sym_index, shift in enumerate(v2.LIST_HASH_SHIFTS):
+    for cell_index in range(9):
+      for piece_index in range(NUM_PIECES):
+        array_cell_hashes[sym_index, cell_index, 1 + piece_index] = (v2.ZOBRIST_P1[cell_index][piece_index] >> shift) & v2.HASH_MASK
+        array_cell_hashes[sym_index, cell_index, 1 + NUM_PIECES + piece_index] = (v2.ZOBRIST_P2[cell_index][piece_index] >> shift) & v2.HASH_MASK
+  array_pieces_p1 = np.array(v2.ZOBRIST_PIECES_P1, dtype=np.uint64)
+  array_pieces_p2 = np.array(v2.ZOBRIST_PIECES_P2, dtype=np.uint64)
+  return array_cell_hashes, array_pieces_p1, array_pieces_p2
+
+ARRAY_CELL_HASHES, ARRAY_PIECES_HASHES_P1, ARRAY_PIECES_HASHES_P2 = createZobristArrays()
+
+def getKeys(array_states, bool_ai_to_move):
+  list_digits = getDigits(array_states)
+  array_keys = None
+  for sym_index in range(len(v2.LIST_SYMMETRIES)):
+    array_hashes = np.zeros(len(array_states), dtype=np.uint64)
+    for cell_index in range(9):
+      array_hashes ^= ARRAY_CELL_HASHES[sym_index, cell_index][list_digits[cell_index]]
+    if array_keys is None:
+      array_keys = array_hashes
+    else: np.minimum(array_keys, array_hashes, out=array_keys)
+  array_keys ^= ARRAY_PIECES_HASHES_P1[getPieces(array_states, PIECES_SHIFT_P1)]
+  array_keys ^= ARRAY_PIECES_HASHES_P2[getPieces(array_states, PIECES_SHIFT_P2)]
+  if bool_ai_to_move:
+    array_keys ^= np.uint64(v2.ZOBRIST_AI_TO_MOVE)
+  return array_keys
+
+
+## ###################
+## GAME RULES
+## ###################
+def getBoards(array_states):
+  ## (N,9) boards of signed piece sizes, as used by the engine
+  array_boards = np.stack(getDigits(array_states), axis=1)
+  bool_ai_piece = array_boards > NUM_PIECES
+  array_boards[bool_ai_piece] = NUM_PIECES - array_boards[bool_ai_piece]
+  return array_boards
+
+def getStatus(array_states):
+  array_pieces_left = getPieces(array_states, PIECES_SHIFT_P1) | getPieces(array_states, PIECES_SHIFT_P2)
+  return v2.checkGameOverStatusBatch(getBoards(array_states), array_pieces_left)
+
+def iterateChildren(array_states, bool_ai_to_move):
+  ## yields (parent indices, child states) for every legal (piece, cell) move
+  list_digits = getDigits(array_states)
+  pieces_shift = PIECES_SHIFT_P2 if bool_ai_to_move else PIECES_SHIFT_P1
+  array_pieces = getPieces(array_states, pieces_shift)
+  for piece_index in range(NUM_PIECES):
+    piece_size = piece_index + 1
+    new_digit = (NUM_PIECES + piece_size) if bool_ai_to_move else piece_size
+    bool_has_piece = ((array_pieces >> piece_index) & 1).astype(bool)
+    for cell_index in range(9):
+      array_digits = list_digits[cell_index]
+      ## the cell is free, or holds a smaller opponent piece
+      if bool_ai_to_move:
+        bool_opp_smaller = (array_digits >= 1) & (array_digits < piece_size)
+      else: bool_opp_smaller = (array_digits > NUM_PIECES) & (array_digits - NUM_PIECES < piece_size)
+      array_parents = np.flatnonzero(bool_has_piece & ((array_digits == 0) | bool_opp_smaller))
+      if len(array_parents) == 0:
+        continue
+      array_children = array_states[array_parents] & ~(DIGIT_MASK << np.uint64(DIGIT_BITS * cell_index))
+      array_children |= np.uint64(new_digit << (DIGIT_BITS * cell_index))
+      array_children &= ~np.uint64(1 << (pieces_shift + piece_index))
+      yield array_parents, array_children
+
+
+## ###################
+## SORTED RUNS
+## ###################
+## arrays of states or solved entries are kept on disk as raw uint64 files, and read
+## back block by block. a sorted array is written as sorted runs of at most a chunk's
+## entries, which are then merged with at most CHUNK_SIZE entries of them in memory.
+def getPath(dir_path, name, index):
+  return os.path.join(dir_path, f"{name}_{index}.bin")
+
+def iterateBlocks(file_path, block_size=CHUNK_SIZE):
+  with open(file_path, "rb") as input_file:
+    while True:
+      array_block = np.fromfile(input_file, dtype=np.uint64, count=block_size)
+      if len(array_block) == 0:
+        return
+      yield array_block
+
+def iterateMerged(list_paths, bool_unique=False):
+  ## the entries of sorted runs in sorted order, block by block. with `bool_unique`,
+  ## each run must hold distinct entries, and every entry is yielded once.
+  block_size = max(1, CHUNK_SIZE // max(1, len(list_paths)))
+  list_iterators = [iterateBlocks(file_path, block_size) for file_path in list_paths]
+  list_buffers = [next(iterator, None) for iterator in list_iterators]
+  while True:
+    list_active = [run_index for run_index, array_buffer in enumerate(list_buffers) if array_buffer is not None]
+    if len(list_active) == 0:
+      return
+    ## every entry up to the smallest last loaded entry of a run is known to come first
+    cutoff = min(list_buffers[run_index][-1] for run_index in list_active)
+    list_blocks = []
+    for run_index in list_active:
+      array_buffer = list_buffers[run_index]
+      split_index = np.searchsorted(array_buffer, cutoff, side="right")
+      list_blocks.append(array_buffer[:split_index])
+      if split_index < len(array_buffer):
+        list_buffers[run_index] = array_buffer[split_index:]
+      else: list_buffers[run_index] = next(list_iterators[run_index], None)
+    array_block = np.concatenate(list_blocks)
+    yield np.unique(array_block) if bool_unique else np.sort(array_block)
+
+def writeBlocks(file_path, iterator_blocks):
+  ## returns the number of entries written
+  num_entries = 0
+  with open(file_path, "wb") as output_file:
+    for array_block in iterator_blocks:
+      array_block.tofile(output_file)
+      num_entries += len(array_block)
+  return num_entries
+
+def writeRun(list_run_paths, dir_path, array_run):
+  file_path = getPath(dir_path, "run", len(list_run_paths))
+  array_run.tofile(file_path)
+  list_run_paths.append(file_path)
+
+def mergeRuns(file_path, list_run_paths, bool_unique=False):
+  num_entries = writeBlocks(file_path, iterateMerged(list_run_paths, bool_unique))
+  for run_path in list_run_paths:
+    os.remove(run_path)
+  return num_entries
+
+
+## ###################
+## SOLVER
+## ###################
+def createLayers(dir_path):
+  ## forward pass: the sorted canonical states of every ply, written to disk one layer
+  ## at a time. the successors of a ply are written as sorted runs of distinct states,
+  ## which are then merged into the next layer.
+  getInitialState().tofile(getPath(dir_path, "layer", 0))
+  list_layer_sizes = [1]
+  for ply in range(NUM_PLIES):
+    bool_ai_to_move = (ply % 2 == 1)
+    list_run_paths = []
+    list_children = []
+    num_children = 0
+    for array_chunk in iterateBlocks(getPath(dir_path, "layer", ply)):
+      array_chunk = array_chunk[getStatus(array_chunk) == v2.STATUS_ONGOING]
+      for _, array_children in iterateChildren(array_chunk, bool_ai_to_move):
+        list_children.append(np.unique(getCanonicalStates(array_children)))
+        num_children += len(list_children[-1])
+        ## once a chunk's worth of successors is held, drop their duplicates, and write
+        ## them as a run if that leaves more than half a chunk
+        if num_children > CHUNK_SIZE:
+          list_children = [np.unique(np.concatenate(list_children))]
+          num_children = len(list_children[0])
+          if num_children > CHUNK_SIZE // 2:
+            writeRun(list_run_paths, dir_path, list_children[0])
+            list_children = []
+            num_children = 0
+    if len(list_children) > 0:
+      writeRun(list_run_paths, dir_path, np.unique(np.concatenate(list_children)))
+    list_layer_sizes.append(mergeRuns(getPath(dir_path, "layer", ply + 1), list_run_paths, bool_unique=True))
+  return list_layer_sizes
+
+def solveChunk(array_chunk, bool_ai_to_move, array_child_table):
+  ## backward pass: score (for the AI) of every state of a chunk, given the sorted solved
+  ## entries of the next ply
+  value_mask = np.uint64(v2.SOLVED_VALUE_MASK)
+  array_status = getStatus(array_chunk)
+  bool_finished = array_status != v2.STATUS_ONGOING
+  array_live = np.flatnonzero(~bool_finished)
+  ## worst case: a side that still has pieces but no legal move loses
+  array_best = np.full(len(array_chunk), -2 if bool_ai_to_move else 2, dtype=np.int8)
+  for array_parents, array_children in iterateChildren(array_chunk[array_live], bool_ai_to_move):
+    array_parents = array_live[array_parents]
+    array_keys = getKeys(array_children, not bool_ai_to_move) & ~value_mask
+    array_indices = np.minimum(np.searchsorted(array_child_table, array_keys), len(array_child_table) - 1)
+    array_entries = array_child_table[array_indices] if (len(array_child_table) > 0) else None
+    if (array_entries is None) or not np.array_equal(array_entries & ~value_mask, array_keys):
+      raise Exception("Failed to solve: a successor state is missing from the next ply.")
+    array_child_values = (array_entries & value_mask).astype(np.int8) - 1
+    if bool_ai_to_move:
+      np.maximum.at(array_best, array_parents, array_child_values)
+    else: np.minimum.at(array_best, array_parents, array_child_values)
+  array_best[array_best == -2] = -1
+  array_best[array_best == 2] = 1
+  ## finished games: a line wins, otherwise both players running out of pieces is a tie
+  array_best[bool_finished] = -1 * array_status[bool_finished]
+  return array_best
+
+def mapSolvedEntries(file_path, num_entries):
+  ## the next ply's solved entries are looked up at random, so they are memory-mapped
+  if num_entries == 0:
+    return np.zeros(0, dtype=np.uint64)
+  return np.memmap(file_path, dtype=np.uint64, mode="r", shape=(num_entries,))
+
+def createSolvedTable(file_path=v2.SOLVED_PATH):
+  time_start = time.time()
+  with tempfile.TemporaryDirectory() as dir_path:
+    list_layer_sizes = createLayers(dir_path)
+    print(f"Enumerated {sum(list_layer_sizes)} states ({time.time() - time_start:.1f} seconds).")
+    list_solved_paths = []
+    for ply in range(NUM_PLIES, -1, -1):
+      bool_ai_to_move = (ply % 2 == 1)
+      if ply == NUM_PLIES:
+        array_child_table = np.zeros(0, dtype=np.uint64)
+      else: array_child_table = mapSolvedEntries(list_solved_paths[-1], list_layer_sizes[ply + 1])
+      ## this ply's solved entries (sorted by key) are kept to solve the previous ply
+      list_run_paths = []
+      for array_chunk in iterateBlocks(getPath(dir_path, "layer", ply)):
+        array_values = solveChunk(array_chunk, bool_ai_to_move, array_child_table)
+        writeRun(list_run_paths, dir_path, np.sort(v2.packSolvedEntries(getKeys(array_chunk, bool_ai_to_move), array_values)))
+      del array_child_table
+      list_solved_paths.append(getPath(dir_path, "solved", ply))
+      mergeRuns(list_solved_paths[-1], list_run_paths)
+      os.remove(getPath(dir_path, "layer", ply))
+      print(f"Solved ply {ply}: {list_layer_sizes[ply]} states ({time.time() - time_start:.1f} seconds).")
+    game_value = int(np.fromfile(list_solved_paths[-1], dtype=np.uint64)[0] & np.uint64(v2.SOLVED_VALUE_MASK)) - 1
+    ## the table is written block by block after its .npy header
+    with open(file_path, "wb") as output_file:
+      np.lib.format.write_array_header_1_0(output_file, {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(np.uint64)),
+        "fortran_order": False,
+        "shape": (sum(list_layer_sizes),)
+      })
+      for array_block in iterateMerged(list_solved_paths):
+        array_block.tofile(output_file)
+  print(f"Game value (for the AI) with perfect play: {game_value}")
+  print(f"Saved solved-game table: {file_path}")
+
+
+## ###################
+## DEFINE MAIN PROGRAM
+## ###################
+def main():
+  if len(sys.argv) > 1:
+    createSolvedTable(sys.argv[1])
+  else: createSolvedTable()
+
+
+## ###################
+## RUN MAIN
+## ###################
+if __name__ == "__main__":
+  main()
+
+
+## END OF PROGRAM